@@ -6,111 +6,2004 @@ Reads a Word document template and generates a beautiful HTML report.
 Usage:
     python generate_report.py input.docx output.html
     python generate_report.py input.docx  (outputs to input_report.html)
+
+Options:
+    --recheck-failures   Retry media URLs that failed on a previous run
+    --progressive        Write the report with direct media URLs first, then
+                         rewrite it with local media once downloads finish
+    --open               Open the report in the browser as soon as it's written
+    --grid-sprites       Draw the Instagram grid preview from a few sprite sheets
+                         instead of one image per post
+    --preview-clips      Play short, small H.264 loops of post videos in the
+                         report (the original stays a click away)
 """
 
 import sys
 import os
+import io
 import re
 import hashlib
-import urllib.request
+import json
+import base64
+import struct
+import shutil
+import tempfile
+import zipfile
+import time
+import random
 import urllib.error
+import http.client
 import ssl
+import threading
+import multiprocessing
+import webbrowser
+import pathlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, wait
+import concurrent.futures
+from urllib.parse import urlsplit, urlunsplit, urljoin, parse_qsl, urlencode
+from email.utils import parsedate_to_datetime
 from docx import Document
 from docx.table import Table
+from lxml import etree
 from datetime import datetime, timedelta
 import calendar
+from collections import OrderedDict
+from fractions import Fraction
+
+# Word document reading (word/document.xml streamed straight from the .docx zip)
+WORD_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PACKAGE_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_RUN_TEXT = {"tab": "\t", "ptab": "\t", "cr": "\n", "noBreakHyphen": "-"}  # Run elements that stand for a character
+_HYPERLINK_RIDS = etree.XPath(".//w:hyperlink/@r:id", namespaces={"w": WORD_NS, "r": REL_NS})
+_FIELD_CODES = etree.XPath(".//w:instrText/text()", namespaces={"w": WORD_NS})
+_FIELD_HYPERLINK = re.compile(r'HYPERLINK\s+["\u201c]([^"\u201d]+)["\u201d]')  # Straight or curly quotes
 
 # Global settings for image downloading
 DOWNLOAD_IMAGES = True  # Set to False to use Dropbox URLs instead
 IMAGE_FOLDER = "images"  # Subfolder for downloaded images
-DOWNLOADED_IMAGES = {}  # Cache: url -> local_path
+DOWNLOADED_IMAGES = {}  # Cache: canonical_media_url(url) -> local_path
+
+# Parallel download settings
+DOWNLOAD_WORKERS = 8  # Size of the download worker pool
+MAX_CONNECTIONS_PER_HOST = 4  # Concurrent fetches allowed against a single host
+PROCESS_WORKERS = os.cpu_count() or 1  # Processes for CPU-bound media work (video decode, resize, encode)
+MEDIA_DEADLINE = 180  # Seconds the whole media stage may take (None = no limit) - unfinished media uses direct URLs
+_DEADLINE_AT = None  # time.time() at which the running media stage gives up (see set_media_deadline)
+
+_HOST_SLOTS = {}  # host -> semaphore limiting concurrent fetches
+_HOST_SLOTS_LOCK = threading.Lock()
+_IN_FLIGHT = {}  # key -> Future for downloads currently running
+_IN_FLIGHT_LOCK = threading.Lock()
+_PRINT_LOCK = threading.Lock()
+_UMASK = os.umask(0)  # Read (and put back) at import, before any worker thread starts
+os.umask(_UMASK)
+NEW_FILE_MODE = 0o666 & ~_UMASK  # What open() gives a new file - mkstemp's 0600 is too private for a report
+
+# Streaming downloads
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # Bytes read/written per chunk - keeps memory flat for any file size
+
+# Remote video reads (HTTP Range requests instead of full downloads)
+REMOTE_BLOCK_SIZE = 256 * 1024  # Bytes per Range request block
+REMOTE_MAX_READAHEAD = 16  # Max blocks fetched in one request while reading sequentially
+REMOTE_CACHE_BLOCKS = 64  # Blocks kept in memory per open video
+
+# Video thumbnails (cached in the media store by video, frame time, size and crop)
+THUMBNAIL_SIZE = 600  # Output size in pixels (square side, or longest side for "fit")
+THUMBNAIL_CROP = "center"  # "center" = square center crop, "fit" = keep aspect ratio
+
+# Preview clips (short H.264/AAC loops of post videos, cached in the media store)
+PREVIEW_CLIPS = False  # Set by --preview-clips
+PREVIEW_CLIP_SECONDS = 6  # Clip length, from the start of the video
+PREVIEW_CLIP_MAX_SIZE = 720  # Longest side in pixels (never upscaled)
+PREVIEW_CLIP_BITRATE = 1200 * 1000  # Video bits per second
+PREVIEW_CLIP_FPS = 30  # Frame rate cap
+PREVIEW_CLIP_READ_MARGIN = 2  # Seconds of packets fetched past the clip, for frames the decoders hold back
+
+# Media probing (real format, dimensions and duration read from the first bytes, cached in the manifest)
+PROBE_BYTES = 16 * 1024  # Bytes read from the start of each file
+PROBE_MAX_READS = 4  # Extra Range reads allowed when the headers are further in (big EXIF block, moov at the end)
+PROBE_MAX_BOX = 1024 * 1024  # Largest MP4 moov / HEIF meta box read
+
+# Responsive images (resized WebP/AVIF/JPEG copies, cached in the media store by source hash)
+RESPONSIVE_IMAGES = True  # Set to False to link only the original files
+RESPONSIVE_WIDTHS = [320, 640, 1080]  # Widths generated (never wider than the original)
+RESPONSIVE_QUALITY = {"avif": 55, "webp": 80, "jpeg": 82}
+_DERIVATIVE_FORMATS = None  # Modern formats this Pillow can write, detected lazily
+
+# Inline image placeholders (tiny previews painted while the full image loads)
+IMAGE_PLACEHOLDERS = True  # Set to False to leave images blank until they load
+PLACEHOLDER_SIZE = 20  # Longest side in pixels - a few hundred bytes as a data: URI
+
+# Grid sprite sheets (the Instagram grid preview painted from a few images instead of one per post)
+GRID_SPRITES = False  # Set by --grid-sprites
+GRID_SPRITE_TILE = 300  # Tile size in pixels (square, center crop like the grid)
+GRID_SPRITE_COLUMNS = 6  # Tiles per sheet row
+GRID_SPRITE_MAX_TILES = 36  # Tiles per sheet - more posts get more sheets
+GRID_SPRITE_QUALITY = 80
+
+# Shared media store (content-addressed, reused across reports and runs)
+MEDIA_CACHE_DIR = os.environ.get("IG_REPORT_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".media_cache")
+MEDIA_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # Size cap - least recently used objects are evicted past this
+MEDIA_CACHE_TTL = 24 * 3600  # Seconds a stored URL is trusted without asking the server again
+FAILURE_TTL = 24 * 3600  # Seconds a dead URL (HTTP 4xx, not an image) is skipped on later runs
+FAILURE_TTL_TRANSIENT = 3600  # Same for network errors, 5xx and the other RETRY_STATUSES
+RECHECK_FAILURES = False  # Set by --recheck-failures: ignore recorded failures and try again
+
+# Parsed-document cache (config/posts/stories/interactions per .docx content hash, in MEDIA_CACHE_DIR/documents)
+DOCUMENT_CACHE = True  # Set to False to parse the .docx on every run
+DOCUMENT_CACHE_ENTRIES = 20  # Parsed documents kept - the least recently used are removed
+PARSER_VERSION = 1  # Bump whenever parsing changes what comes out of parse_document, so old entries are ignored
+_MANIFEST = None  # Loaded lazily: {"urls", "thumbnails", "clips", "derivatives", "probes", "sprites", "failures", "objects"} - see load_manifest
+_MANIFEST_LOCK = threading.RLock()
+_MANIFEST_LOADED_AT = None  # time.time() when load_manifest ran - objects used since are in use by this run
+
+# Shared HTTP session (keep-alive connections + one TLS context for every fetch)
+MAX_REDIRECTS = 5
+_SSL_CONTEXT = None
+_SSL_CONTEXT_LOCK = threading.Lock()
+_CONNECTION_POOL = {}  # (scheme, host, port) -> [idle connections]
+_CONNECTION_POOL_LOCK = threading.Lock()
+
+# Fetch policy (retries for transient errors, circuit breaker for unhealthy hosts)
+FETCH_RETRIES = 3  # Extra attempts after a timeout, reset connection, 429 or 5xx
+RETRY_BACKOFF = 0.5  # Base delay in seconds - doubles each attempt, with full jitter
+RETRY_BACKOFF_MAX = 20  # Longest single wait; a longer Retry-After fails instead
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+CIRCUIT_FAILURES = 5  # Consecutive failures that mark a host unhealthy
+CIRCUIT_COOLDOWN = 30  # Seconds to fail fast before letting one probe request through
+_CIRCUITS = {}  # host[:port] -> {"failures", "opened_at", "probing"}
+_CIRCUITS_LOCK = threading.Lock()
+_FETCH_STATS = {"requests": 0, "retries": 0, "failed": 0, "fast_failed": 0, "circuits_opened": 0}
+_FETCH_STATS_LOCK = threading.Lock()
+
+
+def log(message):
+    """Print a full line at once so output from worker threads doesn't interleave."""
+    with _PRINT_LOCK:
+        print(message, flush=True)
+
+
+def host_slot(url):
+    """
+    Get the semaphore that limits concurrent fetches to the host of a URL.
+    Use as a context manager around the network part of a download.
+    """
+    host = urlsplit(url).netloc.lower()
+    with _HOST_SLOTS_LOCK:
+        slot = _HOST_SLOTS.get(host)
+        if slot is None:
+            slot = threading.BoundedSemaphore(MAX_CONNECTIONS_PER_HOST)
+            _HOST_SLOTS[host] = slot
+    return slot
+
+
+def get_ssl_context():
+    """
+    Get the TLS context shared by every fetch.
+    Doesn't verify certificates (needed for Dropbox redirects).
+    """
+    global _SSL_CONTEXT
+    with _SSL_CONTEXT_LOCK:
+        if _SSL_CONTEXT is None:
+            ctx = ssl.create_default_context()
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+            _SSL_CONTEXT = ctx
+    return _SSL_CONTEXT
+
+
+def _acquire_connection(key, timeout):
+    """Take an idle keep-alive connection for (scheme, host, port) or open a new one.
+    Returns (connection, reused)."""
+    with _CONNECTION_POOL_LOCK:
+        idle = _CONNECTION_POOL.get(key)
+        if idle:
+            conn = idle.pop()
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+    
+    scheme, host, port = key
+    if scheme == "https":
+        return http.client.HTTPSConnection(host, port, timeout=timeout, context=get_ssl_context()), False
+    return http.client.HTTPConnection(host, port, timeout=timeout), False
+
+
+def _release_connection(key, conn, response):
+    """Return a connection to the pool if its response was fully read, otherwise close it."""
+    if response.isclosed() and not response.will_close:
+        with _CONNECTION_POOL_LOCK:
+            idle = _CONNECTION_POOL.setdefault(key, [])
+            if len(idle) < MAX_CONNECTIONS_PER_HOST:
+                idle.append(conn)
+                return
+    conn.close()
+
+
+def close_connections():
+    """Close every idle pooled connection."""
+    with _CONNECTION_POOL_LOCK:
+        for idle in _CONNECTION_POOL.values():
+            for conn in idle:
+                conn.close()
+        _CONNECTION_POOL.clear()
+
+
+def _send_request(url, headers, timeout, method):
+    """
+    Send one request over a pooled connection.
+    Returns (key, connection, response). A reused connection that the server
+    has already closed is retried once on a fresh connection.
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https"):
+        raise urllib.error.URLError(f"unsupported URL scheme: {scheme}")
+    port = parts.port or (443 if scheme == "https" else 80)
+    key = (scheme, parts.hostname, port)
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    
+    while True:
+        conn, reused = _acquire_connection(key, timeout)
+        try:
+            conn.request(method, path, headers=headers)
+            return key, conn, conn.getresponse()
+        except (http.client.HTTPException, OSError) as e:
+            conn.close()
+            if reused and isinstance(e, (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)):
+                continue  # Stale keep-alive connection - try again on a new one
+            raise urllib.error.URLError(e)
+
+
+class CircuitOpenError(urllib.error.URLError):
+    """Raised by open_url when a host's circuit is open - the request was never sent."""
+
+
+class DeadlineExceeded(urllib.error.URLError):
+    """Raised by fetches and media jobs once MEDIA_DEADLINE has passed."""
+
+
+def set_media_deadline(deadline_at):
+    """Set (or clear, with None) the wall-clock time media work must finish by.
+    Also the initializer of the worker processes, so they stop at the same time."""
+    global _DEADLINE_AT
+    _DEADLINE_AT = deadline_at
+
+
+def deadline_remaining():
+    """Seconds left before the media deadline, or None when there is none."""
+    if _DEADLINE_AT is None:
+        return None
+    return _DEADLINE_AT - time.time()
+
+
+def check_deadline():
+    """Raise DeadlineExceeded if the media deadline has passed."""
+    remaining = deadline_remaining()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded("media deadline reached")
+
+
+def wait_result(future):
+    """future.result(), giving up with DeadlineExceeded when the media deadline passes first."""
+    try:
+        return future.result(timeout=deadline_remaining())
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise DeadlineExceeded("media deadline reached")
+
+
+def count_fetch(name, amount=1):
+    """Bump one of the _FETCH_STATS counters."""
+    with _FETCH_STATS_LOCK:
+        _FETCH_STATS[name] += amount
+
+
+def fetch_summary():
+    """One line describing this run's fetch counters."""
+    with _FETCH_STATS_LOCK:
+        stats = dict(_FETCH_STATS)
+    return (f"{stats['requests']} requests, {stats['retries']} retries, {stats['failed']} failed, "
+            f"{stats['fast_failed']} skipped by {stats['circuits_opened']} open circuit(s)")
+
+
+def circuit_allows(host):
+    """
+    False while a host's circuit is open (too many recent failures). After
+    CIRCUIT_COOLDOWN one caller is let through as a probe - it gets "probe"
+    instead of True and must call circuit_probe_done once its request is over;
+    the rest keep failing fast.
+    """
+    with _CIRCUITS_LOCK:
+        circuit = _CIRCUITS.get(host)
+        if not circuit or circuit["opened_at"] is None:
+            return True
+        if not circuit["probing"] and time.monotonic() - circuit["opened_at"] >= CIRCUIT_COOLDOWN:
+            circuit["probing"] = True
+            return "probe"
+        return False
+
+
+def circuit_is_open(host):
+    """True while a host's circuit is open - unlike circuit_allows, never takes the probe slot."""
+    with _CIRCUITS_LOCK:
+        circuit = _CIRCUITS.get(host)
+        return bool(circuit) and circuit["opened_at"] is not None
+
+
+def circuit_probe_done(host):
+    """End a half-open probe however its request ended, so the next one can be let through."""
+    with _CIRCUITS_LOCK:
+        circuit = _CIRCUITS.get(host)
+        if circuit:
+            circuit["probing"] = False
+
+
+def circuit_record(host, ok):
+    """Record a request outcome for a host; CIRCUIT_FAILURES failures in a row open its circuit."""
+    with _CIRCUITS_LOCK:
+        if ok:
+            _CIRCUITS.pop(host, None)
+            return
+        circuit = _CIRCUITS.setdefault(host, {"failures": 0, "opened_at": None, "probing": False})
+        circuit["failures"] += 1
+        reopened = circuit["probing"]
+        circuit["probing"] = False
+        if circuit["failures"] < CIRCUIT_FAILURES or (circuit["opened_at"] is not None and not reopened):
+            return
+        circuit["opened_at"] = time.monotonic()
+    
+    if not reopened:
+        count_fetch("circuits_opened")
+    log(f"   ⚡ {host} looks unhealthy - failing fast for {CIRCUIT_COOLDOWN}s")
+
+
+def retry_delay(attempt, retry_after=None):
+    """
+    Seconds to wait before retry number attempt + 1: full-jitter exponential
+    backoff, or the server's Retry-After (seconds or HTTP date) when it sent one.
+    None when the wait would exceed RETRY_BACKOFF_MAX (not worth retrying).
+    """
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return max(0.0, delay) if delay <= RETRY_BACKOFF_MAX else None
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** attempt))
+
+
+def _can_wait(delay):
+    """True if a retry delay still ends before the media deadline."""
+    remaining = deadline_remaining()
+    return remaining is None or delay < remaining
+
+
+@contextmanager
+def open_url(url, headers=None, timeout=30, method="GET"):
+    """
+    Open a URL over the shared keep-alive session.
+    Follows redirects on pooled connections and raises urllib.error.HTTPError /
+    URLError like urllib.request.urlopen. Yields the http.client response with
+    its final address in response.url.
+    
+    Network errors and RETRY_STATUSES are retried up to FETCH_RETRIES times
+    with backoff (see retry_delay). Hosts with an open circuit fail right away
+    with URLError instead of waiting out the timeout. No request (or wait)
+    runs past the media deadline - DeadlineExceeded is raised instead.
+    """
+    headers = dict(headers or {})
+    attempt = 0
+    redirects = 0
+    while True:
+        check_deadline()
+        host = urlsplit(url).netloc
+        admitted = circuit_allows(host)
+        if not admitted:
+            count_fetch("fast_failed")
+            raise CircuitOpenError(f"{host} is failing, skipped (circuit open)")
+        
+        # A half-open probe must end even if this attempt raises (deadline, bad response)
+        try:
+            remaining = deadline_remaining()
+            request_timeout = timeout if remaining is None else max(0.1, min(timeout, remaining))
+            count_fetch("requests")
+            try:
+                key, conn, response = _send_request(url, headers, request_timeout, method)
+            except urllib.error.URLError as e:
+                if isinstance(e.reason, str):
+                    raise  # Bad URL, not a network problem
+                check_deadline()  # Timed out because the deadline was near - not the host's fault
+                circuit_record(host, ok=False)
+                delay = retry_delay(attempt)
+                if attempt >= FETCH_RETRIES or circuit_is_open(host) or not _can_wait(delay):
+                    count_fetch("failed")
+                    raise
+                attempt += 1
+                count_fetch("retries")
+                time.sleep(delay)
+                continue
+        
+            if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+                response.read()  # Drain so the connection can be reused
+                _release_connection(key, conn, response)
+                circuit_record(host, ok=True)
+                redirects += 1
+                if redirects > MAX_REDIRECTS:
+                    raise urllib.error.URLError(f"too many redirects: {url}")
+                url = urljoin(url, response.getheader("Location"))
+                continue
+        
+            if response.status >= 400:
+                body = response.read()
+                _release_connection(key, conn, response)
+                transient = response.status in RETRY_STATUSES
+                circuit_record(host, ok=not transient)
+                delay = retry_delay(attempt, response.getheader("Retry-After")) if transient else None
+                if delay is None or attempt >= FETCH_RETRIES or circuit_is_open(host) or not _can_wait(delay):
+                    count_fetch("failed")
+                    raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(body))
+                attempt += 1
+                count_fetch("retries")
+                time.sleep(delay)
+                continue
+        
+            circuit_record(host, ok=True)
+        finally:
+            if admitted == "probe":
+                circuit_probe_done(host)
+        
+        response.url = url
+        try:
+            yield response
+        finally:
+            _release_connection(key, conn, response)
+        return
+
+
+def stream_to_file(response, dest_path):
+    """
+    Stream a response body to dest_path in DOWNLOAD_CHUNK_SIZE chunks.
+    Writes to a temp file in the same folder and renames it into place, so an
+    interrupted download (error or media deadline) never leaves a partial file behind.
+    Returns (bytes_written, seconds, sha256_hex).
+    """
+    start = time.monotonic()
+    expected = response.getheader("Content-Length")
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest_path) or ".", suffix=".part")
+    digest = hashlib.sha256()
+    total = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                check_deadline()
+                chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+                digest.update(chunk)
+                total += len(chunk)
+        if expected and expected.isdigit() and total < int(expected):
+            raise IOError(f"incomplete download ({total} of {expected} bytes)")
+        os.chmod(tmp_path, NEW_FILE_MODE)  # Stored media gets hard-linked into reports
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return total, time.monotonic() - start, digest.hexdigest()
+
+
+def format_size(num_bytes):
+    """Format a byte count, e.g. '812.4 KB' or '3.1 MB'."""
+    if num_bytes < 1024 * 1024:
+        return f"{num_bytes / 1024:.1f} KB"
+    return f"{num_bytes / (1024 * 1024):.1f} MB"
+
+
+def format_transfer(num_bytes, seconds):
+    """Format a byte count and throughput for progress lines, e.g. '812.4 KB @ 3.2 MB/s'."""
+    rate = num_bytes / seconds / (1024 * 1024) if seconds > 0 else 0
+    return f"{format_size(num_bytes)} @ {rate:.1f} MB/s"
+
+
+def load_manifest():
+    """
+    Load the media store manifest (once per process).
+    Sections: urls (url -> stored download), thumbnails (render key -> video
+    thumbnail), clips (render key -> preview clip), derivatives (source hash -> responsive copies), probes
+    (url -> format and dimensions), sprites (tiles key -> grid sprite sheet),
+    failures (url -> last failed fetch) and objects (content hash -> stored file).
+    """
+    global _MANIFEST, _MANIFEST_LOADED_AT
+    with _MANIFEST_LOCK:
+        if _MANIFEST is None:
+            _MANIFEST_LOADED_AT = time.time()
+            manifest_path = os.path.join(MEDIA_CACHE_DIR, "manifest.json")
+            try:
+                with open(manifest_path, encoding="utf-8") as f:
+                    _MANIFEST = json.load(f)
+            except (OSError, ValueError):
+                _MANIFEST = {}
+            _MANIFEST.setdefault("urls", {})
+            _MANIFEST.setdefault("thumbnails", {})
+            _MANIFEST.setdefault("clips", {})
+            _MANIFEST.setdefault("derivatives", {})
+            _MANIFEST.setdefault("probes", {})
+            _MANIFEST.setdefault("sprites", {})
+            _MANIFEST.setdefault("failures", {})
+            _MANIFEST.setdefault("objects", {})
+        return _MANIFEST
+
+
+def save_manifest():
+    """Write the media store manifest atomically."""
+    with _MANIFEST_LOCK:
+        if _MANIFEST is None:
+            return
+        os.makedirs(MEDIA_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=MEDIA_CACHE_DIR, suffix=".part")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(_MANIFEST, f, indent=1)
+        os.replace(tmp_path, os.path.join(MEDIA_CACHE_DIR, "manifest.json"))
+
+
+def store_object_path(content_hash, ext):
+    """Path of a stored object: objects/ab/abcdef....ext"""
+    return os.path.join(MEDIA_CACHE_DIR, "objects", content_hash[:2], f"{content_hash}{ext}")
+
+
+def store_lookup(key, section="urls"):
+    """
+    Find a URL (or, with section="thumbnails" / "clips" / "sprites", a render key) in the media store.
+    Returns (manifest_entry, object_path) or (None, None) if it isn't stored.
+    """
+    manifest = load_manifest()
+    with _MANIFEST_LOCK:
+        entry = manifest[section].get(key)
+        obj = manifest["objects"].get(entry["hash"]) if entry else None
+        if not obj:
+            return None, None
+        path = store_object_path(entry["hash"], obj["ext"])
+        if not os.path.exists(path):
+            # Deleted behind our back - forget it
+            manifest["objects"].pop(entry["hash"], None)
+            manifest[section].pop(key, None)
+            return None, None
+        obj["last_used"] = time.time()
+        return entry, path
+
+
+def store_staging_path(ext):
+    """A unique path under incoming/ to write a file before it goes into the store."""
+    incoming_dir = os.path.join(MEDIA_CACHE_DIR, "incoming")
+    os.makedirs(incoming_dir, exist_ok=True)
+    return os.path.join(incoming_dir, f"{threading.get_ident()}_{time.time_ns()}{ext}")
+
+
+def file_sha256(path):
+    """sha256 hex digest of a file, read in DOWNLOAD_CHUNK_SIZE chunks."""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def store_file(staging, ext, content_hash=None):
+    """
+    Move a staged file into the store under its content hash (hashed here if
+    not given). Returns (content_hash, object_path).
+    """
+    if content_hash is None:
+        content_hash = file_sha256(staging)
+    
+    path = store_object_path(content_hash, ext)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.unlink(staging)
+    else:
+        os.replace(staging, path)
+    
+    manifest = load_manifest()
+    with _MANIFEST_LOCK:
+        obj = manifest["objects"].setdefault(content_hash, {})  # Keep a placeholder made for the same content
+        obj.update(ext=ext, size=os.path.getsize(path), last_used=time.time())
+    return content_hash, path
+
+
+def store_response(url, response, ext):
+    """
+    Stream a response into the media store and record url -> content hash.
+    Identical content fetched from different URLs is stored once.
+    Returns (object_path, bytes, seconds).
+    """
+    staging = store_staging_path(ext)
+    num_bytes, seconds, content_hash = stream_to_file(response, staging)
+    content_hash, path = store_file(staging, ext, content_hash)
+    
+    manifest = load_manifest()
+    now = time.time()
+    with _MANIFEST_LOCK:
+        manifest["urls"][url] = {
+            "hash": content_hash,
+            "content_type": response.getheader("Content-Type", ""),
+            "size": num_bytes,
+            "fetched_at": now,
+            "validated_at": now,
+            "etag": response.getheader("ETag"),
+            "last_modified": response.getheader("Last-Modified"),
+        }
+    evict_media_store(keep=content_hash)
+    return path, num_bytes, seconds
+
+
+def failure_lookup(key):
+    """The recorded failure for a URL (or thumbnail key) if it hasn't expired, else None."""
+    if RECHECK_FAILURES:
+        return None
+    manifest = load_manifest()
+    with _MANIFEST_LOCK:
+        failure = manifest["failures"].get(key)
+        if failure and failure["expires_at"] <= time.time():
+            del manifest["failures"][key]
+            return None
+        return failure
+
+
+def record_failure(key, reason, ttl):
+    """Remember that fetching a URL failed, so later runs skip it for ttl seconds."""
+    manifest = load_manifest()
+    now = time.time()
+    with _MANIFEST_LOCK:
+        manifest["failures"][key] = {"reason": reason, "failed_at": now, "expires_at": now + ttl}
+
+
+def clear_failure(key):
+    """Forget a recorded failure once the URL works again."""
+    manifest = load_manifest()
+    with _MANIFEST_LOCK:
+        manifest["failures"].pop(key, None)
+
+
+def failure_for_error(error):
+    """(reason, ttl) to record for a fetch exception, or None if it says nothing about the URL."""
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded)):
+        return None  # Never sent (host skipped) or cut short by the deadline
+    if isinstance(error, urllib.error.HTTPError):
+        transient = error.code in RETRY_STATUSES or error.code >= 500  # Rate limits and timeouts pass too
+        return f"HTTP {error.code}", FAILURE_TTL_TRANSIENT if transient else FAILURE_TTL
+    if isinstance(error, urllib.error.URLError):
+        return f"URL Error: {error.reason}"[:80], FAILURE_TTL_TRANSIENT
+    return str(error)[:80], FAILURE_TTL_TRANSIENT
+
+
+def is_fresh(entry):
+    """True if a stored URL was (re)validated less than MEDIA_CACHE_TTL seconds ago."""
+    return time.time() - entry.get("validated_at", entry.get("fetched_at", 0)) < MEDIA_CACHE_TTL
+
+
+def conditional_headers(entry):
+    """If-None-Match / If-Modified-Since headers for revalidating a stored URL."""
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def store_mark_validated(url, response):
+    """Record a 304 Not Modified: the stored copy is fresh again."""
+    manifest = load_manifest()
+    with _MANIFEST_LOCK:
+        entry = manifest["urls"].get(url)
+        if entry:
+            entry["validated_at"] = time.time()
+            entry["etag"] = response.getheader("ETag") or entry.get("etag")
+            entry["last_modified"] = response.getheader("Last-Modified") or entry.get("last_modified")
+
+
+def evict_media_store(keep=None):
+    """
+    Delete least recently used objects until the store fits in MEDIA_CACHE_MAX_BYTES.
+    Objects looked up or stored by this run are never evicted - another worker may
+    be about to link one - so a run that needs more than the limit leaves the
+    store over it until the next run.
+    """
+    manifest = load_manifest()
+    with _MANIFEST_LOCK:
+        objects = manifest["objects"]
+        total = sum(obj.get("size", 0) for obj in objects.values())
+        if total <= MEDIA_CACHE_MAX_BYTES:
+            return
+        
+        evicted = set()
+        for content_hash, obj in sorted(objects.items(), key=lambda item: item[1].get("last_used", 0)):
+            if total <= MEDIA_CACHE_MAX_BYTES:
+                break
+            if obj.get("last_used", 0) >= _MANIFEST_LOADED_AT:
+                break  # This one and the rest are in use by this run
+            if content_hash == keep:
+                continue
+            try:
+                os.unlink(store_object_path(content_hash, obj["ext"]))
+            except OSError:
+                pass
+            total -= obj.get("size", 0)
+            evicted.add(content_hash)
+        
+        for content_hash in evicted:
+            del objects[content_hash]
+        for section in ("urls", "thumbnails", "clips", "derivatives", "probes", "sprites"):
+            entries = manifest[section]
+            for key in [k for k, entry in entries.items() if entry.get("hash") in evicted]:
+                del entries[key]
+
+
+def link_from_store(store_path, local_path):
+    """
+    Put a stored object at local_path - hard link when possible (no extra disk
+    space), copy when the store is on another volume or links aren't supported.
+    """
+    # Already linked (rename() is a no-op between two links to the same file)
+    if os.path.exists(local_path) and os.path.samefile(store_path, local_path):
+        return
+    
+    tmp_path = f"{local_path}.{threading.get_ident()}_{time.time_ns()}.part"
+    try:
+        os.link(store_path, tmp_path)
+    except OSError:
+        shutil.copy2(store_path, tmp_path)
+    os.replace(tmp_path, local_path)
+
+
+def single_flight(key, func, *args):
+    """
+    Run func(*args) once per key, even when several threads ask for the same key
+    at the same time. Late callers wait for the first call and share its result.
+    """
+    with _IN_FLIGHT_LOCK:
+        future = _IN_FLIGHT.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _IN_FLIGHT[key] = future
+    
+    if not owner:
+        return future.result()
+    
+    try:
+        result = func(*args)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _IN_FLIGHT_LOCK:
+            _IN_FLIGHT.pop(key, None)
+
+# Media probing
+MEDIA_MIME_TYPES = {
+    "jpeg": "image/jpeg", "png": "image/png", "gif": "image/gif", "webp": "image/webp",
+    "avif": "image/avif", "heic": "image/heic",
+    "mp4": "video/mp4", "mov": "video/quicktime", "webm": "video/webm", "mkv": "video/x-matroska",
+}
+MEDIA_EXTENSIONS = {fmt: ".jpg" if fmt == "jpeg" else f".{fmt}" for fmt in MEDIA_MIME_TYPES}
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _probe_result(fmt, width=None, height=None, duration=None):
+    """Probe dict: format, kind (image/video), mime and whatever dimensions were found."""
+    info = {"format": fmt, "kind": "video" if MEDIA_MIME_TYPES[fmt].startswith("video/") else "image",
+            "mime": MEDIA_MIME_TYPES[fmt]}
+    if width and height:
+        info["width"], info["height"] = int(width), int(height)
+    if duration:
+        info["duration"] = round(duration, 3)
+    return info
+
+
+def _read(data, read_at, offset, length):
+    """length bytes at offset - from the probed head when it covers them, else via read_at."""
+    if offset + length <= len(data) or read_at is None:
+        return data[offset:offset + length]
+    return read_at(offset, length)
+
+
+def _jpeg_orientation(segment):
+    """EXIF orientation (1-8) from an APP1 segment body, or 1."""
+    if segment[:6] != b"Exif\0\0":
+        return 1
+    tiff = segment[6:]
+    order = "<" if tiff[:2] == b"II" else ">"
+    try:
+        ifd = struct.unpack(order + "I", tiff[4:8])[0]
+        for i in range(struct.unpack(order + "H", tiff[ifd:ifd + 2])[0]):
+            entry = tiff[ifd + 2 + i * 12: ifd + 14 + i * 12]
+            if struct.unpack(order + "H", entry[:2])[0] == 0x0112:
+                return struct.unpack(order + "H", entry[8:10])[0]
+    except struct.error:
+        pass
+    return 1
+
+
+def _probe_jpeg(data, read_at):
+    """Walk JPEG segments to the frame header. Width/height are as displayed (EXIF rotation applied)."""
+    offset, orientation = 2, 1
+    for _ in range(64):
+        header = _read(data, read_at, offset, 4)
+        if len(header) < 4 or header[0] != 0xFF:
+            break
+        marker, length = header[1], struct.unpack(">H", header[2:4])[0]
+        if marker == 0xFF:
+            offset += 1  # Fill byte
+            continue
+        if marker == 0xE1:
+            orientation = _jpeg_orientation(_read(data, read_at, offset + 4, min(length - 2, 4096)))  # IFD0 comes first
+        elif marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", _read(data, read_at, offset + 5, 4))
+            if orientation in (5, 6, 7, 8):
+                width, height = height, width
+            return _probe_result("jpeg", width, height)
+        offset += 2 + length
+    return _probe_result("jpeg")
+
+
+def _probe_webp(data):
+    chunk = data[12:16]
+    if chunk == b"VP8 " and len(data) >= 30:
+        width, height = struct.unpack("<HH", data[26:30])
+        return _probe_result("webp", width & 0x3FFF, height & 0x3FFF)
+    if chunk == b"VP8L" and len(data) >= 25:
+        bits = struct.unpack("<I", data[21:25])[0]
+        return _probe_result("webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+    if chunk == b"VP8X" and len(data) >= 30:
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return _probe_result("webp", width, height)
+    return _probe_result("webp")
+
+
+def _iter_boxes(buf, start, end):
+    """(type, payload_start, payload_end) for each ISO BMFF box in buf[start:end]."""
+    while start + 8 <= end:
+        size, box_type = struct.unpack(">I4s", buf[start:start + 8])
+        header = 8
+        if size == 1 and start + 16 <= end:
+            size, header = struct.unpack(">Q", buf[start + 8:start + 16])[0], 16
+        elif size == 0:
+            size = end - start
+        if size < header:
+            return
+        yield box_type, start + header, min(start + size, end)
+        start += size
+
+
+def _probe_moov(fmt, moov):
+    """Duration (mvhd) and the first video track's display size (tkhd) from a moov box body."""
+    duration = width = height = None
+    for box_type, start, end in _iter_boxes(moov, 0, len(moov)):
+        if box_type == b"mvhd":
+            if moov[start] == 1:
+                timescale, length = struct.unpack(">IQ", moov[start + 20:start + 32])
+            else:
+                timescale, length = struct.unpack(">II", moov[start + 12:start + 20])
+            duration = length / timescale if timescale else None
+        elif box_type == b"trak" and width is None:
+            for child, child_start, child_end in _iter_boxes(moov, start, end):
+                if child == b"tkhd" and child_end - child_start >= 84:
+                    matrix_a, matrix_b = struct.unpack(">ii", moov[child_end - 44:child_end - 36])
+                    track_width, track_height = struct.unpack(">II", moov[child_end - 8:child_end])
+                    if track_width and track_height:
+                        width, height = track_width >> 16, track_height >> 16
+                        if matrix_a == 0 and matrix_b != 0:
+                            width, height = height, width  # Rotated 90/270 degrees (phone video)
+    return _probe_result(fmt, width, height, duration)
+
+
+def _probe_heif_meta(fmt, meta):
+    """Image size from the first ispe property in a HEIF/AVIF meta box body."""
+    for box_type, start, end in _iter_boxes(meta, 4, len(meta)):  # meta is a full box
+        if box_type == b"iprp":
+            for child, child_start, child_end in _iter_boxes(meta, start, end):
+                if child == b"ipco":
+                    for prop, prop_start, _ in _iter_boxes(meta, child_start, child_end):
+                        if prop == b"ispe":
+                            return _probe_result(fmt, *struct.unpack(">II", meta[prop_start + 4:prop_start + 12]))
+    return _probe_result(fmt)
+
+
+def _probe_isobmff(data, read_at, size):
+    """MP4 / MOV / AVIF / HEIC: walk top-level boxes (reading past the head if needed) to moov or meta."""
+    ftyp_size = struct.unpack(">I", data[:4])[0] if data[4:8] == b"ftyp" else 0
+    brands = data[8:12] + data[16:min(ftyp_size, 256)]  # Major + compatible brands
+    if not ftyp_size or data[8:12] == b"qt  ":
+        fmt = "mov"
+    elif b"avif" in brands or b"avis" in brands:
+        fmt = "avif"
+    elif data[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        fmt = "heic"
+    else:
+        fmt = "mp4"
+    
+    offset = 0
+    for _ in range(64):
+        header = _read(data, read_at, offset, 16)
+        if len(header) < 8:
+            break
+        box_size, box_type = struct.unpack(">I4s", header[:8])
+        header_size = 8
+        if box_size == 1:
+            box_size, header_size = struct.unpack(">Q", header[8:16])[0], 16
+        elif box_size == 0:
+            box_size = (size or len(data)) - offset
+        if box_size < header_size:
+            break
+        if box_type in (b"moov", b"meta"):
+            body = _read(data, read_at, offset + header_size, min(box_size - header_size, PROBE_MAX_BOX))
+            return _probe_moov(fmt, body) if box_type == b"moov" else _probe_heif_meta(fmt, body)
+        offset += box_size
+        if size and offset >= size:
+            break
+    return _probe_result(fmt)
+
+
+def _ebml_vint(buf, pos, keep_marker=False):
+    """EBML variable-length integer at pos -> (value, length); value None for 'unknown size'."""
+    first = buf[pos]
+    length, mask = 1, 0x80
+    while length <= 8 and not first & mask:
+        length += 1
+        mask >>= 1
+    if length > 8 or pos + length > len(buf):
+        raise ValueError("bad EBML integer")
+    value = first if keep_marker else first & (mask - 1)
+    for byte in buf[pos + 1:pos + length]:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = None
+    return value, length
+
+
+def _probe_ebml(data):
+    """WebM / Matroska: doc type, duration (Info) and the video track's pixel size (Tracks) from the head."""
+    found = {"doctype": b"matroska", "scale": 1000000}
+    containers = {0x1A45DFA3, 0x18538067, 0x1549A966, 0x1654AE6B, 0xAE, 0xE0}
+    
+    def walk(start, end):
+        pos = start
+        while pos < end:
+            element, id_length = _ebml_vint(data, pos, keep_marker=True)
+            size, size_length = _ebml_vint(data, pos + id_length)
+            body = pos + id_length + size_length
+            body_end = end if size is None else min(body + size, end)
+            if element == 0x1F43B675:
+                return  # First cluster - all headers seen
+            if element in containers:
+                walk(body, body_end)
+            elif element == 0x4282:
+                found["doctype"] = data[body:body_end]
+            elif element == 0x2AD7B1:
+                found["scale"] = int.from_bytes(data[body:body_end], "big")
+            elif element == 0x4489:
+                found["duration"] = struct.unpack(">f" if body_end - body == 4 else ">d", data[body:body_end])[0]
+            elif element == 0xB0:
+                found.setdefault("width", int.from_bytes(data[body:body_end], "big"))
+            elif element == 0xBA:
+                found.setdefault("height", int.from_bytes(data[body:body_end], "big"))
+            pos = body_end
+    
+    try:
+        walk(0, len(data))
+    except (ValueError, IndexError, struct.error):
+        pass  # Head ended mid-element - keep what was found
+    duration = found.get("duration")
+    return _probe_result("webm" if found["doctype"] == b"webm" else "mkv", found.get("width"), found.get("height"),
+                         duration * found["scale"] / 1e9 if duration else None)
+
+
+def probe_media(data, read_at=None, size=None):
+    """
+    Identify media from its first bytes (magic numbers, not the URL).
+    read_at(offset, length) lets MP4/MOV/JPEG parsing look past the head
+    (e.g. a moov box at the end of the file); size is the full file size if known.
+    Returns {"format", "kind", "mime", ["width", "height"], ["duration"]} or None.
+    """
+    try:
+        if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+            return _probe_result("png", *struct.unpack(">II", data[16:24]))
+        if data[:3] == b"\xff\xd8\xff":
+            return _probe_jpeg(data, read_at)
+        if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+            return _probe_result("gif", *struct.unpack("<HH", data[6:10]))
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return _probe_webp(data)
+        if data[4:8] in (b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip"):
+            return _probe_isobmff(data, read_at, size)
+        if data[:4] == b"\x1a\x45\xdf\xa3":
+            return _probe_ebml(data)
+    except (struct.error, IndexError, ValueError):
+        pass
+    return None
+
+
+def probe_file(path):
+    """probe_media for a local file."""
+    with open(path, 'rb') as f:
+        def read_at(offset, length):
+            f.seek(offset)
+            return f.read(length)
+        return probe_media(f.read(PROBE_BYTES), read_at, os.path.getsize(path))
+
+
+def probe_url(url):
+    """
+    probe_media for a remote file: a Range request for the first PROBE_BYTES
+    (plus a few more when the container index is further in).
+    """
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Accept': '*/*',
+    }
+    with host_slot(url), open_url(url, headers=dict(headers, Range=f"bytes=0-{PROBE_BYTES - 1}"), timeout=30) as response:
+        size = _content_range_total(response) if response.status == 206 else None
+        ranged = bool(size)
+        data = response.read(PROBE_BYTES)  # A server ignoring Range sends the whole file - stop early
+        final_url = response.url
+    
+    blocks = []  # (start, data) already fetched - parsers read small headers one after another
+    
+    def read_at(offset, length):
+        for start, block in blocks:
+            if start <= offset and offset + length <= start + len(block):
+                return block[offset - start:offset - start + length]
+        if not ranged or len(blocks) >= PROBE_MAX_READS:
+            return b""
+        end = min(offset + max(length, PROBE_BYTES), size) - 1
+        if end < offset:
+            return b""
+        with host_slot(final_url), open_url(final_url, headers=dict(headers, Range=f"bytes={offset}-{end}"), timeout=30) as response:
+            if response.status != 206:
+                return b""
+            blocks.append((offset, response.read()))
+        return blocks[-1][1][:length]
+    
+    return probe_media(data, read_at, size)
+
+
+def media_probe(url):
+    """
+    Probe a media URL once and remember the result in the manifest ("probes"):
+    a stored copy is probed locally (keyed to its content hash); otherwise a
+    Range read of the remote file is trusted for MEDIA_CACHE_TTL, and a failed
+    read is skipped like a failed download (see failure_lookup).
+    Concurrent probes of the same URL (thumbnail and clip jobs) share one read.
+    Returns the probe dict or None (unknown format, or the URL can't be read).
+    """
+    return single_flight(("probe", canonical_media_url(url)), _media_probe, url)
+
+
+def _media_probe(url):
+    """Uncached body of media_probe (runs once per canonical URL at a time)."""
+    media_key = canonical_media_url(url)
+    entry, store_path = store_lookup(media_key)
+    manifest = load_manifest()
+    with _MANIFEST_LOCK:
+        cached = manifest["probes"].get(media_key)
+    if cached is not None:
+        if store_path and cached.get("hash") == entry["hash"]:
+            return cached["info"]
+        if not store_path and time.time() - cached["probed_at"] < MEDIA_CACHE_TTL:
+            return cached["info"]
+    
+    failure_key = f"probe {media_key}"
+    if store_path:
+        info, content_hash = probe_file(store_path), entry["hash"]
+    elif failure_lookup(media_key) or failure_lookup(failure_key):
+        return cached["info"] if cached else None  # Known dead link
+    else:
+        try:
+            info = probe_url(get_direct_image_url(get_direct_video_url(url)))
+        except (urllib.error.URLError, OSError, http.client.HTTPException) as e:
+            failure = failure_for_error(e)
+            if failure:
+                record_failure(failure_key, *failure)
+            return cached["info"] if cached else None  # An expired probe still beats guessing
+        clear_failure(failure_key)
+        content_hash = None
+    
+    remember_probe(media_key, info, content_hash)
+    return info
+
+
+def remember_probe(media_key, info, content_hash=None):
+    """Record a probe in the manifest - content_hash ties it to a stored copy, None means a remote read."""
+    with _MANIFEST_LOCK:
+        load_manifest()["probes"][media_key] = {"info": info, "hash": content_hash, "probed_at": time.time()}
+
+
+class PeekedResponse:
+    """A response whose first bytes were already read (to probe them) - read() returns them again first."""
+    
+    def __init__(self, head, response):
+        self.head = head
+        self.response = response
+    
+    def read(self, amt=None):
+        if not self.head:
+            return self.response.read(amt)
+        if amt is None:
+            data, self.head = self.head + self.response.read(), b""
+        else:
+            data, self.head = self.head[:amt], self.head[amt:]
+        return data
+    
+    def getheader(self, name, default=None):
+        return self.response.getheader(name, default)
+
+
+def probe_lookup(url):
+    """The manifest's probe for a URL without any I/O (None if it was never probed or is unknown)."""
+    with _MANIFEST_LOCK:
+        cached = load_manifest()["probes"].get(canonical_media_url(url))
+    return cached["info"] if cached else None
+
+
+def dimension_attrs(probe):
+    """width/height attributes for an image's <img> (lets the browser reserve space before it loads)."""
+    if probe and probe["kind"] == "image" and probe.get("width") and probe.get("height"):
+        return f'width="{probe["width"]}" height="{probe["height"]}" '
+    return ''
+
+
+def is_video_media(media_field, probe=None):
+    """True for a video file - by its probed format when known, else by the extension in the URL."""
+    if probe:
+        return probe["kind"] == "video"
+    video_extensions = [".mov", ".mp4", ".webm", ".avi", ".mkv", ".m4v"]
+    return any(ext in media_field.lower() for ext in video_extensions)
+
 
 # Video thumbnail extraction
-def extract_video_thumbnail(video_url, output_path, frame_time=0.5):
+class RemoteFile(io.RawIOBase):
+    """
+    Read-only, seekable file over HTTP Range requests.
+    Lets PyAV read just the parts of a video it needs (container index and the
+    first frames) instead of the whole file. Blocks are fetched on demand, with
+    growing read-ahead while reads are sequential, and a small LRU of blocks is
+    kept in memory. With a sink (a writable file), every fetched range is also
+    written to it at its own offset.
     """
-    Download a video and extract a thumbnail frame.
-    Uses imageio with bundled ffmpeg.
+    
+    def __init__(self, url, size, headers=None, first_block=b"", sink=None):
+        super().__init__()
+        self.url = url
+        self.size = size
+        self.headers = {k: v for k, v in (headers or {}).items() if k.lower() != "range"}
+        self.bytes_fetched = len(first_block)
+        self.sink = sink
+        if sink:
+            sink.write(first_block)
+        self._pos = 0
+        self._blocks = OrderedDict()  # block index -> bytes
+        self._readahead = 1
+        self._last_fetched = None
+        
+        # Keep whatever the probe request already returned
+        for i in range(0, len(first_block), REMOTE_BLOCK_SIZE):
+            block = first_block[i:i + REMOTE_BLOCK_SIZE]
+            if len(block) == REMOTE_BLOCK_SIZE or i + len(block) == size:
+                self._blocks[i // REMOTE_BLOCK_SIZE] = block
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def tell(self):
+        return self._pos
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError("negative seek position")
+        self._pos = pos
+        return pos
+    
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        wanted = min(len(view), max(0, self.size - self._pos))
+        done = 0
+        while done < wanted:
+            index, offset = divmod(self._pos, REMOTE_BLOCK_SIZE)
+            chunk = self._get_block(index)[offset:offset + wanted - done]
+            if not chunk:
+                break
+            view[done:done + len(chunk)] = chunk
+            done += len(chunk)
+            self._pos += len(chunk)
+        return done
+    
+    def _get_block(self, index):
+        block = self._blocks.get(index)
+        if block is not None:
+            self._blocks.move_to_end(index)
+            return block
+        
+        # Double the read-ahead while reads are sequential, reset it on a jump
+        if self._last_fetched is not None and index == self._last_fetched + 1:
+            self._readahead = min(self._readahead * 2, REMOTE_MAX_READAHEAD)
+        else:
+            self._readahead = 1
+        
+        last_index = min(index + self._readahead, (self.size - 1) // REMOTE_BLOCK_SIZE + 1) - 1
+        for i in range(index + 1, last_index + 1):
+            if i in self._blocks:  # Don't fetch blocks we already have
+                last_index = i - 1
+                break
+        
+        start = index * REMOTE_BLOCK_SIZE
+        data = self._fetch(start, min((last_index + 1) * REMOTE_BLOCK_SIZE, self.size) - 1)
+        for i in range(index, last_index + 1):
+            offset = (i - index) * REMOTE_BLOCK_SIZE
+            self._blocks[i] = data[offset:offset + REMOTE_BLOCK_SIZE]
+        self._last_fetched = last_index
+        
+        while len(self._blocks) > REMOTE_CACHE_BLOCKS:
+            self._blocks.popitem(last=False)
+        return self._blocks[index]
+    
+    def _fetch(self, start, end):
+        headers = dict(self.headers, Range=f"bytes={start}-{end}")
+        with host_slot(self.url), open_url(self.url, headers=headers, timeout=60) as response:
+            if response.status != 206:
+                raise IOError(f"server stopped honouring Range requests (HTTP {response.status})")
+            data = response.read()
+        if len(data) != end - start + 1:
+            raise IOError(f"short range read ({len(data)} of {end - start + 1} bytes)")
+        self.bytes_fetched += len(data)
+        if self.sink:
+            self.sink.seek(start)
+            self.sink.write(data)
+        return data
+
+
+def _content_range_total(response):
+    """Total size from a 206 response's Content-Range header ('bytes 0-99/12345'), or None."""
+    match = re.match(r'bytes\s+\d+-\d+/(\d+)', response.getheader("Content-Range", ""))
+    return int(match.group(1)) if match else None
+
+
+def _video_validator(response):
+    """ETag, Last-Modified and total size of a video response, as one comparable string."""
+    size = _content_range_total(response) or response.getheader("Content-Length")
+    return "|".join(str(value or "") for value in (response.getheader("ETag"), response.getheader("Last-Modified"), size))
+
+
+def open_video_source(url, headers, validator=None):
+    """
+    Prepare a video for decoding (download stage).
+    Returns a source description for fetch_video_reads:
+    {"url", "size", "headers", "first_block"} when the server honours Range
+    requests, or {"path", "transfer"} when it ignores Range - the full body is
+    already on its way then, so it is streamed to a temp file.
+    Both carry the video's "validator". When it equals the validator passed in,
+    nothing more is read and {"validator", "unchanged": True} is returned.
+    """
+    probe_headers = dict(headers, Range=f"bytes=0-{REMOTE_BLOCK_SIZE - 1}")
+    with host_slot(url), open_url(url, headers=probe_headers, timeout=60) as response:
+        current = _video_validator(response)
+        if validator and current == validator:
+            return {"validator": current, "unchanged": True}
+        
+        total = _content_range_total(response)
+        if response.status == 206 and total:
+            return {"url": response.url, "size": total, "headers": headers, "first_block": response.read(),
+                    "validator": current}
+        
+        fd, tmp_path = tempfile.mkstemp(suffix='.mp4')
+        os.close(fd)
+        try:
+            num_bytes, seconds, _ = stream_to_file(response, tmp_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return {"path": tmp_path, "transfer": f"full download {format_transfer(num_bytes, seconds)}",
+                "validator": current}
+
+
+def fetch_video_reads(source, walk):
+    """
+    Fetch the parts of a Range-readable video (see open_video_source) that a
+    render will read, in the calling download thread - so the fetches go
+    through host_slot, the circuits and the connection pool, and the render
+    worker never waits on the network. walk(container) demuxes the video the
+    way the render does, without decoding. The fetched ranges are written at
+    their offsets into a sparse temp file the same size as the video.
+    Returns {"path", "transfer", "validator"}, like a full download.
+    """
+    import av
+    
+    fd, tmp_path = tempfile.mkstemp(suffix='.mp4')
+    try:
+        with os.fdopen(fd, "wb") as sink:
+            sink.truncate(source["size"])
+            reader = RemoteFile(source["url"], source["size"], source["headers"],
+                                first_block=source["first_block"], sink=sink)
+            with av.open(reader) as container:
+                walk(container)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return {"path": tmp_path, "transfer": f"read {format_size(reader.bytes_fetched)} of {format_size(reader.size)}",
+            "validator": source["validator"]}
+
+
+def thumbnail_keyframe(container, frame_time):
+    """
+    Seek to the keyframe a thumbnail is taken from (at or before frame_time,
+    or 10% into the video if that is earlier) and return its packet, or None.
+    """
+    import av
+    
+    stream = container.streams.video[0]
+    duration = container.duration / av.time_base if container.duration else 1.0
+    
+    # Calculate time to extract (0.5s or 10% into video, whichever is smaller)
+    target_time = min(frame_time, duration * 0.1)
+    
+    # Jump to the nearest keyframe at or before the target - no decoding from
+    # the start of the video
+    if target_time > 0 and stream.time_base:
+        target_pts = int(target_time / stream.time_base) + (stream.start_time or 0)
+        container.seek(target_pts, stream=stream, backward=True, any_frame=False)
+    for packet in container.demux(stream):
+        if packet.dts is not None and packet.is_keyframe:
+            return packet
+    return None
+
+
+def render_video_thumbnail(source, output_path, frame_time=0.5, size=THUMBNAIL_SIZE, crop=THUMBNAIL_CROP):
+    """
+    Decode one frame, crop and resize it and save as JPEG (processing stage).
+    crop="center" gives a size x size square, crop="fit" keeps the aspect ratio
+    with the longest side at size.
+    CPU-bound - runs in a worker process. source is a local file from
+    open_video_source / fetch_video_reads ({"path", "transfer", ...}).
+    Returns per-job stats: bytes read plus decode/resize/encode seconds.
+    """
+    import av
+    from PIL import Image
+    
+    stats = {"transfer": source.get("transfer")}
+    started = time.perf_counter()
+    with av.open(source["path"]) as container:
+        # Decode just the keyframe packet (flushing the decoder so it hands the
+        # frame back right away)
+        packet = thumbnail_keyframe(container, frame_time)
+        codec = container.streams.video[0].codec_context
+        frames = codec.decode(packet) + codec.decode(None) if packet else []
+        if not frames:
+            raise ValueError("no video frames")
+        
+        # Convert to PIL for processing
+        img = frames[0].to_image()
+    decoded = time.perf_counter()
+    
+    width, height = img.size
+    if crop == "fit":
+        scale = size / max(width, height)
+        target = (max(1, round(width * scale)), max(1, round(height * scale)))
+    else:
+        # Crop to square (center crop)
+        side = min(width, height)
+        left = (width - side) // 2
+        top = (height - side) // 2
+        img = img.crop((left, top, left + side, top + side))
+        target = (size, size)
+    
+    # Resize to reasonable thumbnail size (reducing_gap does a cheap
+    # integer downscale first on 4K frames before the LANCZOS pass)
+    img = img.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    resized = time.perf_counter()
+    
+    # Save as JPEG
+    img.save(output_path, 'JPEG', quality=85)
+    
+    stats["decode"] = decoded - started
+    stats["resize"] = resized - decoded
+    stats["encode"] = time.perf_counter() - resized
+    return stats
+
+
+def thumbnail_cache_key(video_url, frame_time, size, crop):
+    """Key of a video thumbnail in the media store - changes when any render input does."""
+    params = json.dumps([video_url, frame_time, size, crop])
+    return hashlib.sha256(params.encode()).hexdigest()
+
+
+def extract_video_thumbnail(video_url, output_path, frame_time=0.5, process_pool=None):
+    """
+    Extract a thumbnail frame from a video.
+    Reads the video through HTTP Range requests so only the container index and
+    the first frames are fetched; downloads the whole file only when the server
+    ignores Range. Uses PyAV for decoding.
+    
+    Thumbnails are kept in the shared media store, keyed by canonical video
+    URL, frame time, THUMBNAIL_SIZE and THUMBNAIL_CROP, and linked into output_path - so
+    renamed posts and other output folders reuse them. Once MEDIA_CACHE_TTL has
+    passed, the Range probe compares the video's ETag / Last-Modified / size
+    and only decodes again if the video changed.
+    
+    The network part runs in the calling thread; decoding and image work run on
+    process_pool when given (so several reels are thumbnailed in parallel),
+    otherwise inline.
     
     Args:
         video_url: URL to video file (Dropbox, etc.)
         output_path: Path to save the thumbnail image
         frame_time: Time in seconds to extract frame from (default 0.5s)
+        process_pool: Optional ProcessPoolExecutor for the CPU-bound part
     
     Returns:
         True if successful, False otherwise
     """
-    import tempfile
+    thumb_name = os.path.basename(output_path)
+    
+    # Get direct video URL (fetched) and its canonical form (cache keys)
+    direct_url = get_direct_video_url(video_url)
+    media_key = canonical_media_url(video_url)
+    key = thumbnail_cache_key(media_key, frame_time, THUMBNAIL_SIZE, THUMBNAIL_CROP)
+    
+    # Thumbnail from before the media store - nothing to validate it against
+    entry, _ = store_lookup(key, "thumbnails")
+    if not entry and os.path.exists(output_path):
+        log(f"   📹 Video thumbnail exists: {thumb_name}")
+        return True
+    
+    # Known dead video (see --recheck-failures)
+    failure_key = f"thumbnail {media_key}"
+    failure = failure_lookup(failure_key)
+    if not entry and failure:
+        log(f"   🎬 Thumbnail skipped: {thumb_name} (failed before: {failure['reason']})")
+        return False
+    
     try:
-        import imageio.v3 as iio
-        from PIL import Image
-        
-        # Get direct video URL
-        direct_url = get_direct_video_url(video_url)
-        
-        print(f"   🎬 Extracting thumbnail...", end=" ", flush=True)
-        
-        # Download video to temp file first (needed for seeking)
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': '*/*',
+        # Several posts may show the same video - render it only once
+        store_path, status = single_flight(("thumbnail", key), _cached_video_thumbnail,
+                                           direct_url, key, frame_time, process_pool)
+    except ImportError:
+        log(f"   🎬 ⚠️ PyAV not installed - using placeholder")
+        return False
+    except DeadlineExceeded:
+        return False  # Already reported by download_all_images
+    except Exception as e:
+        log(f"   🎬 Thumbnail failed: {thumb_name} ❌ {str(e)[:40]}")
+        failure = failure_for_error(e)
+        if failure:
+            record_failure(failure_key, *failure)
+        return False
+    
+    clear_failure(failure_key)
+    if not (os.path.exists(output_path) and os.path.samefile(store_path, output_path)):
+        if status:
+            log(f"   🎬 Extracted thumbnail: {thumb_name} ✓ ({status})")
+        else:
+            log(f"   ♻️  {thumb_name} (from thumbnail cache)")
+    link_from_store(store_path, output_path)
+    return True
+
+
+def _cached_video_thumbnail(direct_url, key, frame_time, process_pool):
+    """Uncached body of extract_video_thumbnail (runs once per thumbnail key)."""
+    return cached_video_render(direct_url, key, "thumbnails", ".jpg", render_video_thumbnail,
+                               (frame_time, THUMBNAIL_SIZE, THUMBNAIL_CROP),
+                               lambda container: thumbnail_keyframe(container, frame_time),
+                               {"frame_time": frame_time, "size": THUMBNAIL_SIZE, "crop": THUMBNAIL_CROP}, process_pool)
+
+
+def cached_video_render(direct_url, key, section, ext, render, render_args, walk, params, process_pool):
+    """
+    Something rendered from a video (thumbnail, preview clip), kept in the
+    media store under manifest[section][key] with the video's validator.
+    A fresh entry is reused as is; after MEDIA_CACHE_TTL a Range probe checks
+    whether the video changed before rendering again.
+    render(source, staging_path, *render_args) runs on process_pool (or
+    inline) and returns stats; walk(container) tells fetch_video_reads which
+    parts of a Range-readable video it needs. params are recorded in the
+    manifest entry.
+    Returns (object_path, status) - status is None when the stored file
+    was reused, otherwise a description of the transfer and render work.
+    """
+    entry, store_path = store_lookup(key, section)
+    if store_path and is_fresh(entry):
+        return store_path, None
+    
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'Accept': '*/*',
+    }
+    
+    try:
+        source = open_video_source(direct_url, headers, entry.get("validator") if store_path else None)
+    except Exception:
+        # Couldn't reach the video - a stale stored thumbnail still beats none
+        if store_path:
+            return store_path, None
+        raise
+    
+    if source.get("unchanged"):
+        with _MANIFEST_LOCK:
+            entry["validated_at"] = time.time()
+        return store_path, None
+    
+    staging = store_staging_path(ext)
+    try:
+        if "url" in source:
+            source = fetch_video_reads(source, walk)
+        if process_pool:
+            stats = wait_result(process_pool.submit(render, source, staging, *render_args))
+        else:
+            stats = render(source, staging, *render_args)
+        content_hash, store_path = store_file(staging, ext)
+    finally:
+        # Clean up temp files
+        for path in (source.get("path"), staging):
+            if path and os.path.exists(path):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+    
+    manifest = load_manifest()
+    now = time.time()
+    with _MANIFEST_LOCK:
+        manifest[section][key] = {
+            "hash": content_hash,
+            "video_url": canonical_media_url(direct_url),
+            **params,
+            "validator": source["validator"],
+            "fetched_at": now,
+            "validated_at": now,
         }
+    evict_media_store(keep=content_hash)
+    timings = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in stats.items() if name != "transfer")
+    return store_path, f"{stats['transfer']}; {timings}"
+
+
+# Preview clips
+def render_preview_clip(source, output_path, seconds, max_size, bitrate, fps):
+    """
+    Transcode the first seconds of a video to a small H.264/AAC MP4 - longest
+    side at most max_size, at most fps frames per second, bitrate bits/s
+    (processing stage, runs in a worker process). Keeps the video's rotation.
+    source is a local file like for render_video_thumbnail. Returns per-job
+    stats like render_video_thumbnail.
+    """
+    import av
+    
+    stats = {"transfer": source.get("transfer")}
+    started = time.perf_counter()
+    with av.open(source["path"]) as src, av.open(output_path, "w", format="mp4", options={"movflags": "+faststart"}) as dst:
+        in_video = src.streams.video[0]
+        in_audio = src.streams.audio[0] if src.streams.audio else None
+        width, height = in_video.codec_context.width, in_video.codec_context.height
+        scale = min(1.0, max_size / max(width, height))
+        rate = max(1, min(fps, round(float(in_video.average_rate or fps))))
         
-        request = urllib.request.Request(direct_url, headers=headers)
-        
-        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp_file:
-            tmp_path = tmp_file.name
-            with urllib.request.urlopen(request, timeout=60, context=ctx) as response:
-                tmp_file.write(response.read())
+        out_video = dst.add_stream("libx264", rate=rate)
+        out_video.width = max(2, round(width * scale / 2) * 2)  # Even sizes for yuv420p
+        out_video.height = max(2, round(height * scale / 2) * 2)
+        out_video.pix_fmt = "yuv420p"
+        out_video.codec_context.time_base = Fraction(1, rate)
+        out_video.bit_rate = bitrate
+        out_video.options = {"preset": "veryfast", "maxrate": str(bitrate), "bufsize": str(bitrate * 2)}
+        out_audio = None
+        if in_audio:
+            out_audio = dst.add_stream("aac", rate=44100)
+            out_audio.bit_rate = 96000
         
+        # The header is written with the first packet, and the rotation (known
+        # from the first decoded frame) has to be in it - hold packets until then
+        start = src.start_time / av.time_base if src.start_time else 0
+        rotation = None
+        pending = []
+        next_frame = 0
+        finished = set()
+        for packet in src.demux([s for s in (in_video, in_audio) if s]):
+            for frame in packet.decode():
+                if frame.time is None or packet.stream in finished:
+                    continue
+                t = frame.time - start
+                if t >= seconds:
+                    finished.add(packet.stream)
+                    continue
+                if packet.stream is in_video:
+                    if rotation is None:
+                        rotation = frame.rotation or 0
+                        if rotation:
+                            out_video.set_display_rotation(rotation)
+                    if t < next_frame / rate - 0.5 / rate:
+                        continue  # Over the frame rate cap
+                    out_frame = frame.reformat(width=out_video.width, height=out_video.height, format="yuv420p")
+                    out_frame.pts = next_frame
+                    out_frame.time_base = out_video.codec_context.time_base
+                    next_frame += 1
+                    pending.extend(out_video.encode(out_frame))
+                else:
+                    frame.pts = None  # The encoder renumbers resampled audio from zero
+                    pending.extend(out_audio.encode(frame))
+                if rotation is not None and pending:
+                    dst.mux(pending)
+                    pending = []
+            if len(finished) == (2 if in_audio else 1):
+                break
+        if rotation is None:
+            raise ValueError("no video frames")
+        pending.extend(out_video.encode(None))
+        if out_audio:
+            pending.extend(out_audio.encode(None))
+        dst.mux(pending)
+    
+    stats["transcode"] = time.perf_counter() - started
+    return stats
+
+
+def preview_clip_reads(container, seconds):
+    """
+    Demux what render_preview_clip reads: the video and audio packets of the
+    first seconds, plus PREVIEW_CLIP_READ_MARGIN. Used by fetch_video_reads.
+    """
+    import av
+    
+    streams = container.streams.video[:1] + container.streams.audio[:1]
+    start = container.start_time / av.time_base if container.start_time else 0
+    reading = set(streams)
+    for packet in container.demux(streams):
+        if packet.pts is not None and float(packet.pts * packet.time_base) - start >= seconds + PREVIEW_CLIP_READ_MARGIN:
+            reading.discard(packet.stream)
+            if not reading:
+                break
+
+
+def preview_clip_key(video_url, seconds, max_size, bitrate, fps):
+    """Key of a preview clip in the media store - changes when any render input does."""
+    params = json.dumps(["clip", video_url, seconds, max_size, bitrate, fps])
+    return hashlib.sha256(params.encode()).hexdigest()
+
+
+def extract_preview_clip(video_url, output_path, process_pool=None):
+    """
+    Make a short, small H.264 loop of a video (see render_preview_clip) for
+    the report to play instead of the original. Reads only the start of the
+    video through Range requests; the transcode runs on process_pool.
+    Clips are kept in the media store like thumbnails (keyed by canonical
+    video URL and the PREVIEW_CLIP_* settings, revalidated against the
+    video's ETag / Last-Modified / size) and linked into output_path.
+    Returns True if successful, False otherwise.
+    """
+    clip_name = os.path.basename(output_path)
+    direct_url = get_direct_video_url(video_url)
+    media_key = canonical_media_url(video_url)
+    settings = {"seconds": PREVIEW_CLIP_SECONDS, "max_size": PREVIEW_CLIP_MAX_SIZE,
+                "bitrate": PREVIEW_CLIP_BITRATE, "fps": PREVIEW_CLIP_FPS}
+    key = preview_clip_key(media_key, *settings.values())
+    
+    failure_key = f"clip {media_key}"
+    if failure_lookup(failure_key) and not store_lookup(key, "clips")[0]:
+        return False
+    
+    try:
+        store_path, status = single_flight(("clip", key), cached_video_render, direct_url, key, "clips", ".mp4",
+                                           render_preview_clip, tuple(settings.values()),
+                                           lambda container: preview_clip_reads(container, PREVIEW_CLIP_SECONDS),
+                                           settings, process_pool)
+    except ImportError:
+        log(f"   🎞️  ⚠️ PyAV not installed - reels play the original video")
+        return False
+    except DeadlineExceeded:
+        return False  # Already reported by download_all_images
+    except Exception as e:
+        log(f"   🎞️  Preview clip failed: {clip_name} ❌ {str(e)[:40]}")
+        failure = failure_for_error(e)
+        if failure:
+            record_failure(failure_key, *failure)
+        return False
+    
+    clear_failure(failure_key)
+    if not (os.path.exists(output_path) and os.path.samefile(store_path, output_path)):
+        if status:
+            log(f"   🎞️  Preview clip: {clip_name} ✓ ({status})")
+        else:
+            log(f"   ♻️  {clip_name} (from clip cache)")
+    link_from_store(store_path, output_path)
+    return True
+
+
+def localize_preview_clip(url, output_dir, title, is_video=False, process_pool=None):
+    """
+    Preview clip for a post's first media URL, if it is a video (probed type,
+    else the is_video guess). Returns the clip path relative to output_dir, or None.
+    """
+    probe = media_probe(url) if is_video else probe_lookup(url)
+    if not (probe["kind"] == "video" if probe else is_video):
+        return None
+    
+    url_hash = hashlib.md5(canonical_media_url(url).encode()).hexdigest()[:12]
+    safe_title = filename_title(title)
+    clip_filename = f"{safe_title}_clip_{url_hash}.mp4" if safe_title else f"clip_{url_hash}.mp4"
+    os.makedirs(os.path.join(output_dir, IMAGE_FOLDER), exist_ok=True)
+    
+    if extract_preview_clip(url, os.path.join(output_dir, IMAGE_FOLDER, clip_filename), process_pool):
+        return f"{IMAGE_FOLDER}/{clip_filename}"
+    return None
+
+# Responsive image derivatives
+def derivative_formats():
+    """Modern formats Pillow can write here, best first (AVIF needs Pillow 11.2+ or pillow-avif-plugin)."""
+    global _DERIVATIVE_FORMATS
+    if _DERIVATIVE_FORMATS is None:
         try:
-            # Read video metadata to get duration
-            meta = iio.immeta(tmp_path, plugin='pyav')
-            duration = meta.get('duration', 1.0)
-            
-            # Calculate frame to extract (0.5s or 10% into video, whichever is smaller)
-            target_time = min(frame_time, duration * 0.1)
-            fps = meta.get('fps', 30)
-            target_frame = int(target_time * fps)
-            
-            # Read the specific frame
-            frame = iio.imread(tmp_path, index=target_frame, plugin='pyav')
-            
-            # Convert to PIL for processing
-            img = Image.fromarray(frame)
-            
-            # Crop to square (center crop)
-            width, height = img.size
-            size = min(width, height)
-            left = (width - size) // 2
-            top = (height - size) // 2
-            img = img.crop((left, top, left + size, top + size))
-            
-            # Resize to reasonable thumbnail size
-            img = img.resize((600, 600), Image.Resampling.LANCZOS)
-            
-            # Save as JPEG
-            img.save(output_path, 'JPEG', quality=85)
-            
-            print(f"✓")
-            return True
-            
-        finally:
-            # Clean up temp file
-            try:
-                os.unlink(tmp_path)
-            except:
-                pass
-                
+            from PIL import features
+            _DERIVATIVE_FORMATS = [fmt for fmt in ("avif", "webp") if features.check(fmt)]
+        except ImportError:
+            _DERIVATIVE_FORMATS = []
+    return _DERIVATIVE_FORMATS
+
+
+def render_image_derivatives(source_path, staging_prefix, widths, formats, quality):
+    """
+    Resize an image to each width and save it in each format plus a JPEG
+    fallback (PNG if it has transparency) - processing stage, runs in a worker
+    process. Widths wider than the original are dropped; the original width is
+    used instead when it's below the largest requested width.
+    Returns {"width", "height", "fallback", "files": [[format, width, path], ...]},
+    or None for animated images (resizing would drop the animation).
+    """
+    from PIL import Image, ImageOps
+    
+    with Image.open(source_path) as img:
+        if getattr(img, "n_frames", 1) > 1:
+            return None
+        img = ImageOps.exif_transpose(img)
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+        img = img.convert("RGBA" if has_alpha else "RGB")
+    
+    width, height = img.size
+    plan = [w for w in widths if w < width]
+    if width <= max(widths) or not plan:
+        plan.append(width)
+    
+    fallback = "png" if has_alpha else "jpeg"
+    files = []
+    for target_width in plan:
+        if target_width == width:
+            resized = img
+        else:
+            target = (target_width, max(1, round(height * target_width / width)))
+            resized = img.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for fmt in formats + [fallback]:
+            path = f"{staging_prefix}_{target_width}.{fmt}"
+            if fmt == "png":
+                resized.save(path, "PNG", optimize=True)
+            else:
+                resized.save(path, fmt.upper(), quality=quality.get(fmt, 80), **({"progressive": True} if fmt == "jpeg" else {}))
+            files.append([fmt, target_width, path])
+    return {"width": width, "height": height, "fallback": fallback, "files": files}
+
+
+def image_derivatives(source_hash, source_path, process_pool=None):
+    """
+    Responsive copies of an image, generated once per source hash and kept in
+    the media store. Returns the manifest "derivatives" entry, or None if the
+    image can't (or shouldn't) be resized.
+    """
+    return single_flight(("derivatives", source_hash), _image_derivatives, source_hash, source_path, process_pool)
+
+
+def _image_derivatives(source_hash, source_path, process_pool):
+    """Uncached body of image_derivatives (runs once per source hash)."""
+    params = [RESPONSIVE_WIDTHS, derivative_formats(), RESPONSIVE_QUALITY]
+    manifest = load_manifest()
+    with _MANIFEST_LOCK:
+        entry = manifest["derivatives"].get(source_hash)
+        if entry and entry["params"] == params:
+            if entry.get("skip"):
+                return None
+            paths = [store_object_path(content_hash, ext) for _, _, content_hash, ext in entry["files"]]
+            if all(os.path.exists(path) for path in paths):
+                now = time.time()
+                for _, _, content_hash, _ in entry["files"]:
+                    if content_hash in manifest["objects"]:
+                        manifest["objects"][content_hash]["last_used"] = now
+                return entry
+    
+    staging_prefix = store_staging_path("")
+    args = (source_path, staging_prefix, RESPONSIVE_WIDTHS, derivative_formats(), RESPONSIVE_QUALITY)
+    if process_pool:
+        result = wait_result(process_pool.submit(render_image_derivatives, *args))
+    else:
+        result = render_image_derivatives(*args)
+    
+    if result is None:
+        entry = {"hash": source_hash, "params": params, "skip": True}
+    else:
+        files = []
+        for fmt, width, path in result["files"]:
+            ext = ".jpg" if fmt == "jpeg" else f".{fmt}"
+            content_hash, _ = store_file(path, ext)
+            files.append([fmt, width, content_hash, ext])
+        entry = {"hash": source_hash, "params": params, "width": result["width"], "height": result["height"],
+                 "fallback": result["fallback"], "files": files}
+    with _MANIFEST_LOCK:
+        manifest["derivatives"][source_hash] = entry
+    evict_media_store(keep=source_hash)
+    return None if result is None else entry
+
+
+# Inline image placeholders
+def render_placeholder(source_path, size, fmt):
+    """
+    Shrink an image to at most size x size pixels and return it as a data: URI
+    (processing stage, runs in a worker process).
+    """
+    from PIL import Image, ImageOps
+    
+    with Image.open(source_path) as img:
+        img.draft("RGB", (size * 8, size * 8))  # JPEG: decode at a fraction of full size
+        img = ImageOps.exif_transpose(img).convert("RGB")
+    img.thumbnail((size, size), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    img.save(buffer, fmt.upper(), quality=40)
+    return f"data:image/{fmt};base64,{base64.b64encode(buffer.getvalue()).decode('ascii')}"
+
+
+def image_placeholder(source_path, process_pool=None, content_hash=None):
+    """
+    A PLACEHOLDER_SIZE preview of an image as a data: URI, made once per
+    content and kept on its media store object. Returns None if the image
+    can't be read.
+    """
+    if content_hash is None:
+        content_hash = file_sha256(source_path)
+    return single_flight(("placeholder", content_hash), _image_placeholder, content_hash, source_path, process_pool)
+
+
+def _image_placeholder(content_hash, source_path, process_pool):
+    """Uncached body of image_placeholder (runs once per content hash)."""
+    manifest = load_manifest()
+    with _MANIFEST_LOCK:
+        obj = manifest["objects"].get(content_hash)
+        if obj and "placeholder" in obj:
+            return obj["placeholder"]
+    
+    args = (source_path, PLACEHOLDER_SIZE, "webp" if "webp" in derivative_formats() else "jpeg")
+    try:
+        if process_pool:
+            placeholder = wait_result(process_pool.submit(render_placeholder, *args))
+        else:
+            placeholder = render_placeholder(*args)
+    except (ImportError, DeadlineExceeded):
+        return None
+    except Exception:
+        placeholder = None  # Unreadable image - remember that too
+    
+    with _MANIFEST_LOCK:
+        obj = manifest["objects"].get(content_hash)
+        if obj:
+            obj["placeholder"] = placeholder
+    return placeholder
+
+
+def placeholder_attrs(placeholder, fit="contain", style=""):
+    """
+    style/onload attributes that paint a placeholder (see image_placeholder)
+    behind an <img> until the image itself has loaded. style is the element's
+    own inline CSS, kept in front.
+    """
+    if not placeholder:
+        return f'style="{style}" ' if style else ''
+    style = f"{style} background: #1A1A1A url({placeholder}) center / {fit} no-repeat;".lstrip()
+    return f'style="{style}" onload="this.style.backgroundImage=\'none\'" '
+
+
+def localize_image(url, output_dir, index=0, post_title="", process_pool=None):
+    """
+    download_image plus its placeholder and responsive copies, linked next to
+    it in the images folder.
+    Returns (local_path_or_url, responsive, placeholder) - responsive is None
+    when there are no copies, otherwise {"src", "srcset", "sources": [(mime, srcset), ...]}
+    for render_responsive_img; placeholder is a data: URI or None.
+    """
+    local_path = download_image(url, output_dir, index, post_title)
+    if not local_path or local_path.startswith("http"):
+        return local_path, None, None
+    
+    entry, source_path = store_lookup(canonical_media_url(url))
+    if source_path:
+        source_hash = entry["hash"]
+    else:
+        source_path = os.path.join(output_dir, local_path)
+        source_hash = file_sha256(source_path)
+    placeholder = image_placeholder(source_path, process_pool, source_hash) if IMAGE_PLACEHOLDERS else None
+    
+    stem, ext = os.path.splitext(local_path)
+    if not RESPONSIVE_IMAGES or ext.lower() == ".gif":
+        return local_path, None, placeholder
+    
+    try:
+        derivatives = image_derivatives(source_hash, source_path, process_pool)
+        if not derivatives:
+            return local_path, None, placeholder
+        
+        srcsets = {}
+        for fmt, width, content_hash, file_ext in derivatives["files"]:
+            relative_path = f"{stem}_{width}w{file_ext}"
+            link_from_store(store_object_path(content_hash, file_ext), os.path.join(output_dir, relative_path))
+            srcsets.setdefault(fmt, []).append((width, relative_path))
     except ImportError:
-        print(f"⚠️ imageio not installed - using placeholder")
-        return False
+        return local_path, None, placeholder
     except Exception as e:
-        print(f"❌ {str(e)[:40]}")
-        return False
+        log(f"   🖼️  {os.path.basename(local_path)} ❌ responsive copies: {str(e)[:40]}")
+        return local_path, None, placeholder
+    
+    def srcset(fmt):
+        return ", ".join(f"{path} {width}w" for width, path in srcsets[fmt])
+    
+    fallback = derivatives["fallback"]
+    return local_path, {
+        "src": srcsets[fallback][-1][1],
+        "srcset": srcset(fallback),
+        "sources": [(f"image/{fmt}", srcset(fmt)) for fmt in srcsets if fmt != fallback],
+    }, placeholder
+
+
+def render_responsive_img(src, responsive, sizes, attrs):
+    """
+    An <img> for src with the given extra attributes. With responsive copies
+    (see localize_image) it becomes a <picture> whose <source>s and srcset/sizes
+    let the browser fetch the smallest file in the best format it supports.
+    """
+    if not responsive:
+        return f'<img src="{src}" {attrs}>'
+    sources = ''.join(f'<source type="{mime}" srcset="{srcset}" sizes="{sizes}">' for mime, srcset in responsive["sources"])
+    return (f'<picture class="responsive-picture">{sources}'
+            f'<img src="{responsive["src"]}" srcset="{responsive["srcset"]}" sizes="{sizes}" {attrs}></picture>')
+
+
+def filename_title(title):
+    """A post title cut down to something safe in file names (may be empty)."""
+    # Replace ALL whitespace (newlines, tabs, carriage returns, spaces) with underscore
+    safe_title = re.sub(r'\s+', '_', title or "")
+    # Remove Windows reserved characters: < > : " / \ | ? *
+    safe_title = re.sub(r'[<>:"/\\|?*]', '', safe_title)
+    # Keep only alphanumeric, underscore, hyphen
+    safe_title = re.sub(r'[^\w\-]', '', safe_title)
+    # Collapse multiple underscores and truncate
+    return re.sub(r'_+', '_', safe_title)[:30].strip('_')
+
 
 def download_image(url, output_dir, index=0, post_title=""):
     """
@@ -120,9 +2013,22 @@ def download_image(url, output_dir, index=0, post_title=""):
     if not url or not DOWNLOAD_IMAGES:
         return url
     
-    # Check cache first
-    if url in DOWNLOADED_IMAGES:
-        return DOWNLOADED_IMAGES[url]
+    # Check cache first (any spelling of the same share link counts)
+    media_key = canonical_media_url(url)
+    if media_key in DOWNLOADED_IMAGES:
+        return DOWNLOADED_IMAGES[media_key]
+    
+    # Several posts/stories may request the same URL at once - fetch it only once
+    return single_flight(("image", media_key), _download_image, url, output_dir, index, post_title)
+
+
+def _download_image(url, output_dir, index, post_title):
+    """Uncached body of download_image (runs once per canonical URL)."""
+    media_key = canonical_media_url(url)
+    
+    # Another worker may have finished this URL while we were waiting
+    if media_key in DOWNLOADED_IMAGES:
+        return DOWNLOADED_IMAGES[media_key]
     
     # Get direct download URL
     direct_url = get_direct_image_url(url)
@@ -132,101 +2038,292 @@ def download_image(url, output_dir, index=0, post_title=""):
     os.makedirs(images_dir, exist_ok=True)
     
     # Generate filename from URL hash + extension
-    url_hash = hashlib.md5(url.encode()).hexdigest()[:12]
+    url_hash = hashlib.md5(media_key.encode()).hexdigest()[:12]
+    safe_title = filename_title(post_title)
     
-    # Try to get extension from URL
-    ext = ".jpg"  # default
-    for test_ext in [".png", ".jpg", ".jpeg", ".gif", ".webp"]:
-        if test_ext.lower() in url.lower():
-            ext = test_ext
-            break
+    def image_name(probe):
+        # Extension from the probed format, else guessed from the URL
+        if probe and probe["kind"] == "image":
+            ext = MEDIA_EXTENSIONS[probe["format"]]
+        else:
+            ext = ".jpg"  # default
+            for test_ext in [".png", ".jpg", ".jpeg", ".gif", ".webp"]:
+                if test_ext.lower() in url.lower():
+                    ext = test_ext
+                    break
+        filename = f"{safe_title}_{index}_{url_hash}{ext}" if safe_title else f"img_{index}_{url_hash}{ext}"
+        return ext, filename, os.path.join(images_dir, filename), f"{IMAGE_FOLDER}/{filename}"
+    
+    # A stored copy is probed locally (once - the probe is cached with its hash)
+    entry, store_path = store_lookup(media_key)
+    ext, filename, local_path, relative_path = image_name(media_probe(url) if store_path else probe_lookup(url))
+    
+    # Reuse a fresh copy from the shared media store (other reports, renamed posts)
+    if store_path and is_fresh(entry):
+        if not (os.path.exists(local_path) and os.path.samefile(store_path, local_path)):
+            log(f"   ♻️  {filename} (from media cache)")
+        link_from_store(store_path, local_path)
+        DOWNLOADED_IMAGES[media_key] = relative_path
+        return relative_path
     
-    # Clean post title for filename - handle newlines, tabs, and invalid characters
-    if post_title:
-        # Replace ALL whitespace (newlines, tabs, carriage returns, spaces) with underscore
-        safe_title = re.sub(r'\s+', '_', post_title)
-        # Remove Windows reserved characters: < > : " / \ | ? *
-        safe_title = re.sub(r'[<>:"/\\|?*]', '', safe_title)
-        # Keep only alphanumeric, underscore, hyphen
-        safe_title = re.sub(r'[^\w\-]', '', safe_title)
-        # Collapse multiple underscores and truncate
-        safe_title = re.sub(r'_+', '_', safe_title)[:30].strip('_')
-    else:
-        safe_title = ""
-    filename = f"{safe_title}_{index}_{url_hash}{ext}" if safe_title else f"img_{index}_{url_hash}{ext}"
-    local_path = os.path.join(images_dir, filename)
-    relative_path = f"{IMAGE_FOLDER}/{filename}"
-    
-    # Skip if already downloaded
-    if os.path.exists(local_path):
-        DOWNLOADED_IMAGES[url] = relative_path
+    # Skip if already downloaded (file from before the media store, no validators to check)
+    if not store_path and os.path.exists(local_path):
+        DOWNLOADED_IMAGES[media_key] = relative_path
         return relative_path
     
+    # Known dead link (see --recheck-failures) - don't wait on it again
+    failure = failure_lookup(media_key)
+    if not store_path and failure:
+        hours = (failure["expires_at"] - time.time()) / 3600
+        log(f"   ⏭️  {filename} (failed before: {failure['reason']} - rechecked in {hours:.1f}h)")
+        DOWNLOADED_IMAGES[media_key] = direct_url
+        return direct_url
+    
+    failure = None
     try:
-        # Create SSL context that doesn't verify (for Dropbox redirects)
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        
         # Download with headers to look like a browser
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
         }
+        # Stale stored copy - ask the server whether it changed
+        if store_path:
+            headers.update(conditional_headers(entry))
         
-        request = urllib.request.Request(direct_url, headers=headers)
-        
-        print(f"   📥 Downloading: {filename}...", end=" ", flush=True)
-        
-        with urllib.request.urlopen(request, timeout=30, context=ctx) as response:
-            # Check content type
+        with host_slot(direct_url), open_url(direct_url, headers=headers, timeout=30) as response:
+            if response.status == 304 and store_path:
+                response.read()
+                store_mark_validated(media_key, response)
+                clear_failure(media_key)
+                link_from_store(store_path, local_path)
+                log(f"   ♻️  {filename} ✓ (not modified)")
+                DOWNLOADED_IMAGES[media_key] = relative_path
+                return relative_path
+            
+            # Check content type - when the server doesn't call it an image, the first
+            # bytes decide (and a video found this way is remembered for the next run)
             content_type = response.headers.get('Content-Type', '')
+            body = response
             if 'image' not in content_type and 'octet-stream' not in content_type:
-                print(f"❌ (not an image: {content_type})")
-                DOWNLOADED_IMAGES[url] = direct_url  # Fall back to URL
-                return direct_url
-            
-            # Read and save
-            data = response.read()
-            with open(local_path, 'wb') as f:
-                f.write(data)
+                head = response.read(PROBE_BYTES)
+                probe = probe_media(head)
+                if not (probe and probe["kind"] == "image"):
+                    log(f"   📥 {filename} ❌ (not an image: {content_type})")
+                    record_failure(media_key, f"not an image ({content_type})", FAILURE_TTL)
+                    if probe:
+                        remember_probe(media_key, probe)
+                    DOWNLOADED_IMAGES[media_key] = direct_url  # Fall back to URL
+                    return direct_url
+                body = PeekedResponse(head, response)
             
-            file_size = len(data) / 1024  # KB
-            print(f"✓ ({file_size:.1f} KB)")
+            # Stream into the media store, then name the file by its real format and
+            # link it into this report's images folder
+            store_path, num_bytes, seconds = store_response(media_key, body, ext)
+            ext, filename, local_path, relative_path = image_name(media_probe(url))
+            link_from_store(store_path, local_path)
+            clear_failure(media_key)
+            log(f"   📥 {filename} ✓ ({format_transfer(num_bytes, seconds)})")
             
-            DOWNLOADED_IMAGES[url] = relative_path
+            DOWNLOADED_IMAGES[media_key] = relative_path
             return relative_path
             
     except urllib.error.HTTPError as e:
-        print(f"❌ HTTP {e.code}")
+        log(f"   📥 {filename} ❌ HTTP {e.code}")
+        failure = failure_for_error(e)
+    except DeadlineExceeded:
+        pass  # Already reported by download_all_images
     except urllib.error.URLError as e:
-        print(f"❌ URL Error: {e.reason}")
+        log(f"   📥 {filename} ❌ URL Error: {e.reason}")
+        failure = failure_for_error(e)
     except Exception as e:
-        print(f"❌ {str(e)[:50]}")
+        log(f"   📥 {filename} ❌ {str(e)[:50]}")
+        failure = failure_for_error(e)
+    
+    # Couldn't revalidate - a stale stored copy still beats a remote hotlink
+    if store_path and os.path.exists(store_path):
+        link_from_store(store_path, local_path)
+        log(f"   ♻️  {filename} (using stale cached copy)")
+        DOWNLOADED_IMAGES[media_key] = relative_path
+        return relative_path
     
-    # Fall back to original URL on failure
-    DOWNLOADED_IMAGES[url] = direct_url
+    # Fall back to original URL on failure (and skip it on the next runs)
+    if failure:
+        record_failure(media_key, *failure)
+    DOWNLOADED_IMAGES[media_key] = direct_url
     return direct_url
 
 
+def localize_post_media(url, output_dir, index, title, is_video=False, process_pool=None):
+    """
+    Localize one post media URL: a video gets an extracted thumbnail,
+    anything else (or a failed thumbnail) goes through localize_image.
+    The probed media type decides. URLs that look like videos (is_video) are
+    probed up front - their header is read through Range for the thumbnail
+    anyway; anything else is downloaded and probed from the stored copy, and
+    turns out to be a video when the server's first bytes say so.
+    Returns (local_path_or_url, thumbnail_relative_path_or_None, responsive_or_None,
+    placeholder_or_None).
+    """
+    probe = media_probe(url) if is_video else probe_lookup(url)
+    if probe["kind"] == "video" if probe else is_video:
+        localized = localize_video_thumbnail(url, output_dir, title, process_pool)
+        if localized:
+            return localized
+    
+    # Fall back to URL if thumbnail extraction fails
+    local_path, responsive, placeholder = localize_image(url, output_dir, index, title, process_pool)
+    if local_path.startswith("http") and not (probe or is_video) and (probe_lookup(url) or {}).get("kind") == "video":
+        localized = localize_video_thumbnail(url, output_dir, title, process_pool)
+        if localized:
+            return localized
+    return local_path, None, responsive, placeholder
+
+
+def localize_video_thumbnail(url, output_dir, title, process_pool=None):
+    """
+    Thumbnail for a video URL, linked into the images folder.
+    Returns localize_post_media's tuple, or None if no thumbnail could be made.
+    """
+    # Generate thumbnail filename
+    url_hash = hashlib.md5(canonical_media_url(url).encode()).hexdigest()[:12]
+    safe_title = filename_title(title)
+    thumb_filename = f"{safe_title}_thumb_{url_hash}.jpg" if safe_title else f"thumb_{url_hash}.jpg"
+    thumb_path = os.path.join(output_dir, IMAGE_FOLDER, thumb_filename)
+    thumb_relative = f"{IMAGE_FOLDER}/{thumb_filename}"
+    
+    # Create images dir
+    os.makedirs(os.path.join(output_dir, IMAGE_FOLDER), exist_ok=True)
+    
+    # Extract thumbnail (or link it from the thumbnail cache)
+    if not extract_video_thumbnail(url, thumb_path, 0.5, process_pool):
+        return None
+    placeholder = image_placeholder(thumb_path, process_pool) if IMAGE_PLACEHOLDERS else None
+    return thumb_relative, thumb_relative, None, placeholder
+
+
+def media_priority(item, index=0, is_story=False, is_clip=False):
+    """
+    Scheduling order for media jobs - what a reader sees first is fetched first:
+    covers / first carousel images (earliest posts first), then later slides,
+    then stories, then preview clips (optional, and the heaviest work).
+    Undated items go last within their group.
+    """
+    tier = 3 if is_clip else 2 if is_story else (0 if index == 0 else 1)
+    return (tier, item.date or datetime.max, index)
+
+
+def job_result(future, fallback):
+    """A media job's result, or fallback if it didn't finish before the deadline."""
+    if future.done() and not future.cancelled():
+        return future.result()
+    return fallback
+
+
+# Grid sprite sheets
+def render_sprite_sheet(sources, output_path, tile, columns, quality):
+    """
+    Paste a tile x tile center crop of each source image into one JPEG sheet,
+    left to right and top to bottom. Unreadable sources leave their tile blank.
+    """
+    from PIL import Image, ImageOps
+    
+    rows = -(-len(sources) // columns)
+    sheet = Image.new("RGB", (columns * tile, rows * tile), (26, 26, 26))
+    for i, source in enumerate(sources):
+        try:
+            with Image.open(source) as img:
+                img.draft("RGB", (tile, tile))  # JPEG: decode at a fraction of full size
+                img = ImageOps.exif_transpose(img).convert("RGB")
+        except (OSError, ValueError):
+            continue
+        sheet.paste(ImageOps.fit(img, (tile, tile), Image.Resampling.LANCZOS), ((i % columns) * tile, (i // columns) * tile))
+    sheet.save(output_path, "JPEG", quality=quality, progressive=True)
+
+
+def build_grid_sprites(posts, output_dir):
+    """
+    Compose the Instagram grid tiles (video thumbnail or first image of each
+    post) into sprite sheets of up to GRID_SPRITE_MAX_TILES, earliest posts
+    first, so the grid preview paints from one or two requests.
+    Sheets are kept in the media store, keyed by their tiles' content and
+    the sprite settings. Sets post.grid_sprite = {"sheet", "size",
+    "position"} (CSS background-size / background-position values).
+    """
+    tiles = []
+    for post in sorted(posts, key=lambda p: p.date or datetime.max):
+        local_urls = post.local_media_urls or []
+        source = post.video_thumbnail or (local_urls[0] if local_urls else None)
+        if source and not source.startswith("http"):
+            tiles.append((post, os.path.join(output_dir, source)))
+    
+    manifest = load_manifest()
+    for start in range(0, len(tiles), GRID_SPRITE_MAX_TILES):
+        chunk = tiles[start:start + GRID_SPRITE_MAX_TILES]
+        sources = [path for _, path in chunk]
+        # A short sheet is only as wide as its tiles - the CSS below uses the same layout
+        columns = min(len(chunk), GRID_SPRITE_COLUMNS)
+        rows = -(-len(chunk) // columns)
+        params = [[file_sha256(path) for path in sources], GRID_SPRITE_TILE, columns, GRID_SPRITE_QUALITY]
+        key = hashlib.sha256(json.dumps(params).encode()).hexdigest()
+        
+        _, store_path = store_lookup(key, "sprites")
+        if not store_path:
+            staging = store_staging_path(".jpg")
+            try:
+                render_sprite_sheet(sources, staging, GRID_SPRITE_TILE, columns, GRID_SPRITE_QUALITY)
+            except ImportError:
+                log("   🧩 ⚠️ Pillow not installed - the grid keeps one image per post")
+                return
+            content_hash, store_path = store_file(staging, ".jpg")
+            with _MANIFEST_LOCK:
+                manifest["sprites"][key] = {"hash": content_hash, "tiles": len(chunk)}
+            evict_media_store(keep=content_hash)
+        
+        sheet = f"{IMAGE_FOLDER}/grid_sprite_{key[:12]}.jpg"
+        link_from_store(store_path, os.path.join(output_dir, sheet))
+        
+        for i, (post, _) in enumerate(chunk):
+            column, row = i % columns, i // columns
+            x = column * 100 / (columns - 1) if columns > 1 else 0
+            y = row * 100 / (rows - 1) if rows > 1 else 0
+            post.grid_sprite = {"sheet": sheet, "size": f"{columns * 100}% {rows * 100}%",
+                                "position": f"{x:.4g}% {y:.4g}%"}
+        log(f"   🧩 {sheet} ({len(chunk)} tiles)")
+
+
 def download_all_images(posts, stories, output_dir):
     """
     Download all images from posts and stories.
     Updates the MediaURL fields with local paths.
+    
+    Downloads run on a pool of DOWNLOAD_WORKERS threads, with at most
+    MAX_CONNECTIONS_PER_HOST fetches against the same host at a time, in
+    media_priority order. Video thumbnails, preview clips (PREVIEW_CLIPS) and
+    responsive image copies are made on a pool of PROCESS_WORKERS processes
+    fed by the download threads.
+    Whatever isn't done after MEDIA_DEADLINE seconds keeps its direct URL.
+    Results are written back in the original order. With GRID_SPRITES the
+    grid tiles are then composed into sprite sheets (see build_grid_sprites).
     """
     if not DOWNLOAD_IMAGES:
         print("\n⏭️  Image downloading disabled - using Dropbox URLs")
         return
     
     print("\n📦 Downloading images...")
+    set_media_deadline(time.time() + MEDIA_DEADLINE if MEDIA_DEADLINE else None)
     
-    total_images = 0
-    downloaded = 0
+    post_jobs = []   # (post, [[url, future] per URL])
+    story_jobs = []  # (story, [url, future])
+    clip_jobs = []   # (post, [url, future]) - preview clip of the post's video
+    jobs = []        # (priority, [url, future] slot to fill, function, args)
     
-    # Video extensions for detection
-    video_extensions = [".mov", ".mp4", ".webm", ".avi", ".mkv", ".m4v"]
+    # Workers start on the first submitted task, so runs with nothing to render
+    # pay nothing. They are spawned, not forked, so they don't inherit pooled
+    # connections or held locks
+    process_pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=set_media_deadline, initargs=(_DEADLINE_AT,))
     
-    # Process posts
+    # Collect posts
     for post in posts:
         media_field = post.get("MediaURL", "")
         if not media_field:
@@ -235,67 +2332,98 @@ def download_all_images(posts, stories, output_dir):
         title = post.get("Title", "")
         urls = parse_media_urls_raw(media_field)  # Get raw URLs without conversion
         
-        # Check if this is a video post
-        is_video = any(ext in media_field.lower() for ext in video_extensions)
+        # Guess whether this is a video post (only the first URL is the video) - probing decides
+        is_video = post.media_kind == "video"
         
-        new_urls = []
-        for i, url in enumerate(urls):
-            total_images += 1
-            
-            # For videos, try to extract a thumbnail
-            if is_video and i == 0:  # Only for first URL (the video)
-                # Generate thumbnail filename
-                url_hash = hashlib.md5(url.encode()).hexdigest()[:12]
-                safe_title = re.sub(r'\s+', '_', title)
-                safe_title = re.sub(r'[<>:"/\\|?*]', '', safe_title)
-                safe_title = re.sub(r'[^\w\-]', '', safe_title)
-                safe_title = re.sub(r'_+', '_', safe_title)[:30].strip('_')
-                thumb_filename = f"{safe_title}_thumb_{url_hash}.jpg" if safe_title else f"thumb_{url_hash}.jpg"
-                thumb_path = os.path.join(output_dir, IMAGE_FOLDER, thumb_filename)
-                thumb_relative = f"{IMAGE_FOLDER}/{thumb_filename}"
-                
-                # Create images dir
-                os.makedirs(os.path.join(output_dir, IMAGE_FOLDER), exist_ok=True)
-                
-                # Try to extract thumbnail if not already exists
-                if os.path.exists(thumb_path):
-                    print(f"   📹 Video thumbnail exists: {thumb_filename}")
-                    new_urls.append(thumb_relative)
-                    downloaded += 1
-                    post["_video_thumbnail"] = thumb_relative
-                elif extract_video_thumbnail(url, thumb_path):
-                    new_urls.append(thumb_relative)
-                    downloaded += 1
-                    post["_video_thumbnail"] = thumb_relative
-                else:
-                    # Fall back to URL if thumbnail extraction fails
-                    local_path = download_image(url, output_dir, i, title)
-                    if not local_path.startswith("http"):
-                        downloaded += 1
-                    new_urls.append(local_path)
-            else:
-                local_path = download_image(url, output_dir, i, title)
-                if not local_path.startswith("http"):
-                    downloaded += 1
-                new_urls.append(local_path)
+        slots = [[url, None] for url in urls]
+        post_jobs.append((post, slots))
+        for i, slot in enumerate(slots):
+            jobs.append((media_priority(post, i), slot, localize_post_media,
+                         (slot[0], output_dir, i, title, is_video and i == 0, process_pool)))
         
-        # Update post with local paths
-        post["_local_media_urls"] = new_urls
+        if PREVIEW_CLIPS and urls:
+            slot = [urls[0], None]
+            clip_jobs.append((post, slot))
+            jobs.append((media_priority(post, is_clip=True), slot, localize_preview_clip,
+                         (urls[0], output_dir, title, is_video, process_pool)))
     
-    # Process stories
+    # Collect stories
     for story in stories:
         url = story.get("MediaURL", "")
         if not url:
             continue
         
-        total_images += 1
         title = story.get("Title", "")
-        local_path = download_image(url, output_dir, 0, title)
+        slot = [url, None]
+        story_jobs.append((story, slot))
+        jobs.append((media_priority(story, is_story=True), slot, localize_image, (url, output_dir, 0, title, process_pool)))
+    
+    # Queue in priority order (the pool runs jobs first in, first out)
+    pool = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS)
+    jobs.sort(key=lambda job: job[0])
+    for _, slot, func, args in jobs:
+        slot[1] = pool.submit(func, *args)
+    
+    _, unfinished = wait([slot[1] for _, slot, _, _ in jobs], timeout=deadline_remaining())
+    if unfinished:
+        print(f"\n⏱️  Media deadline ({MEDIA_DEADLINE}s) reached - {len(unfinished)} item(s) keep their direct URLs")
+    
+    # Past the deadline, running jobs stop at their next check - don't wait for them
+    pool.shutdown(wait=not unfinished, cancel_futures=True)
+    process_pool.shutdown(wait=not unfinished, cancel_futures=True)
+    if not unfinished:
+        set_media_deadline(None)
+    
+    total_images = 0
+    downloaded = 0
+    
+    # Collect results in the original order
+    for post, slots in post_jobs:
+        new_urls = []
+        responsive_media = []
+        placeholders = []
+        for i, (url, future) in enumerate(slots):
+            local_path, thumbnail, responsive, placeholder = job_result(future, (get_direct_image_url(url), None, None, None))
+            total_images += 1
+            if not local_path.startswith("http"):
+                downloaded += 1
+            if thumbnail and i == 0:
+                post.video_thumbnail = thumbnail
+            new_urls.append(local_path)
+            responsive_media.append(responsive)
+            placeholders.append(placeholder)
+        
+        # Update post with local paths (and their responsive copies, placeholders and probes, same order)
+        post.local_media_urls = new_urls
+        post.responsive_media = responsive_media
+        post.media_placeholders = placeholders
+        post.media_probes = [probe_lookup(url) for url, _ in slots]
+        if post.media_probes and post.media_probes[0]:
+            post.media_kind = post.media_probes[0]["kind"]
+    
+    for story, (url, future) in story_jobs:
+        local_path, responsive, placeholder = job_result(future, (get_direct_image_url(url), None, None))
+        total_images += 1
         if not local_path.startswith("http"):
             downloaded += 1
-        story["_local_media_url"] = local_path
+        story.local_media_url = local_path
+        story.responsive_media = responsive
+        story.media_placeholder = placeholder
+        story.media_probe = probe_lookup(url)
+        if story.media_probe:
+            story.media_kind = story.media_probe["kind"]
+    
+    for post, (url, future) in clip_jobs:
+        post.preview_clip = job_result(future, None)
     
+    save_manifest()
     print(f"\n✅ Downloaded {downloaded}/{total_images} images to {IMAGE_FOLDER}/")
+    print(f"   Fetches: {fetch_summary()}")
+    
+    if GRID_SPRITES:
+        print("\n🧩 Building grid sprite sheets...")
+        build_grid_sprites(posts, output_dir)
+        save_manifest()
 
 
 def parse_media_urls_raw(media_field):
@@ -323,77 +2451,224 @@ def parse_media_urls_raw(media_field):
     
     return urls
 
-def extract_hyperlinks_from_cell(cell, doc_rels):
-    """Extract all hyperlink URLs from a cell using doc relationships AND field codes."""
-    import re
-    hyperlinks = []
+def hyperlink_targets(rels):
+    """rId -> URL for the hyperlink relationships of a python-docx part (doc.part.rels)."""
+    return {rid: rel.target_ref for rid, rel in rels.items() if 'hyperlink' in rel.reltype.lower()}
 
-    try:
-        # Get cell XML
-        cell_xml = cell._tc.xml
-
-        # Method 1: Find all r:id references in the cell XML (standard hyperlinks)
-        rids = re.findall(r'r:id="(rId\d+)"', cell_xml)
-
-        # Look up each rId in the document relationships
-        for rid in rids:
-            if rid in doc_rels:
-                rel = doc_rels[rid]
-                # Check if it's a hyperlink
-                if 'hyperlink' in rel.reltype.lower():
-                    hyperlinks.append(rel.target_ref)
-        
-        # Method 2: Extract field code hyperlinks (HYPERLINK "url" in instrText)
-        # This handles links pasted from browser or created differently in Word
-        # Handle both straight quotes (") and curly quotes (" ")
-        field_links = re.findall(r'HYPERLINK\s+["\u201c]([^"\u201d]+)["\u201d]', cell_xml)
-        for link in field_links:
-            # Unescape XML entities
-            link = link.replace('&amp;', '&')
-            if link not in hyperlinks:
-                hyperlinks.append(link)
-                
-    except:
-        pass
 
+def cell_hyperlinks(tc, rel_urls):
+    """
+    Hyperlink URLs in a w:tc element: w:hyperlink relationships (looked up in
+    rel_urls, see hyperlink_targets), then HYPERLINK field codes.
+    """
+    hyperlinks = [rel_urls[rid] for rid in _HYPERLINK_RIDS(tc) if rid in rel_urls]
+    
+    # Field code hyperlinks (HYPERLINK "url" in instrText) come from links pasted from
+    # a browser or created differently in Word - one field code can be split over runs
+    for link in _FIELD_HYPERLINK.findall("".join(_FIELD_CODES(tc))):
+        if link not in hyperlinks:
+            hyperlinks.append(link)
     return hyperlinks
 
 
-def extract_tables(doc):
-    """Extract all tables from the document."""
-    tables = []
-    for table in doc.tables:
-        rows = []
-        for row in table.rows:
-            cells = [cell.text.strip() for cell in row.cells]
-            rows.append(cells)
-        tables.append(rows)
-    return tables
+def extract_hyperlinks_from_cell(cell, rel_urls):
+    """Extract all hyperlink URLs from a python-docx cell (relationships AND field codes)."""
+    return cell_hyperlinks(cell._tc, rel_urls)
 
 
-def extract_tables_with_hyperlinks(doc):
-    """Extract all tables from the document, including embedded hyperlinks."""
-    # Get document relationships for hyperlink lookup
-    doc_rels = doc.part.rels
+def extract_document_tables(doc):
+    """
+    Extract all tables from the document in one pass over the cells.
+    Each cell comes back as a (text, hyperlinks) tuple; use table_text() and
+    table_values() for the plain-text and hyperlink-aware views of a table.
+    """
+    # Document hyperlink relationships, looked up by rId for every cell
+    rel_urls = hyperlink_targets(doc.part.rels)
     
     tables = []
     for table in doc.tables:
+        # Merged cells show up once per grid column they span - read each only once
+        seen = {}
         rows = []
         for row in table.rows:
             cells = []
             for cell in row.cells:
-                text = cell.text.strip()
-                hyperlinks = extract_hyperlinks_from_cell(cell, doc_rels)
-                # If we have hyperlinks, use them instead of/alongside text
-                if hyperlinks:
-                    # Join all hyperlinks with newlines for URLs
-                    cells.append('\n'.join(hyperlinks))
-                else:
-                    cells.append(text)
+                entry = seen.get(cell._tc)
+                if entry is None:
+                    entry = (cell.text.strip(), extract_hyperlinks_from_cell(cell, rel_urls))
+                    seen[cell._tc] = entry
+                cells.append(entry)
             rows.append(cells)
         tables.append(rows)
     return tables
 
+
+def table_text(table):
+    """Plain-text view of an extracted table (rows of cell text)."""
+    return [[text for text, hyperlinks in row] for row in table]
+
+
+def table_values(table):
+    """Hyperlink-aware view of an extracted table: linked cells become their URLs."""
+    # If we have hyperlinks, use them instead of the text, joined with newlines
+    return [['\n'.join(hyperlinks) if hyperlinks else text for text, hyperlinks in row] for row in table]
+
+
+def extract_tables(doc):
+    """Extract all tables from the document."""
+    return [table_text(table) for table in extract_document_tables(doc)]
+
+
+def extract_tables_with_hyperlinks(doc):
+    """Extract all tables from the document, including embedded hyperlinks."""
+    return [table_values(table) for table in extract_document_tables(doc)]
+
+def _w(tag):
+    """Clark-notation name for a WordprocessingML tag."""
+    return f"{{{WORD_NS}}}{tag}"
+
+
+def _docx_part_name(source, target):
+    """Zip member name for a relationship target, relative to the part that holds it."""
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return os.path.normpath(os.path.join(os.path.dirname(source), target)).replace(os.sep, "/")
+
+
+def _docx_hyperlink_rels(package, rels_name):
+    """rId -> URL for the hyperlink relationships in a .rels part (empty if there's none)."""
+    try:
+        root = etree.fromstring(package.read(rels_name))
+    except KeyError:
+        return {}
+    return {rel.get("Id"): rel.get("Target") for rel in root.iter(f"{{{PACKAGE_REL_NS}}}Relationship")
+            if "hyperlink" in rel.get("Type", "").lower()}
+
+
+def _run_text(run):
+    """Text of a w:r element, with tabs and breaks turned into characters the way python-docx does."""
+    parts = []
+    for child in run:
+        name = etree.QName(child).localname
+        if name == "t":
+            parts.append(child.text or "")
+        elif name == "br":
+            # Only line breaks are text - page and column breaks aren't
+            if child.get(_w("type"), "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif name in _RUN_TEXT:
+            parts.append(_RUN_TEXT[name])
+    return "".join(parts)
+
+
+def _stream_cell(tc, rel_urls):
+    """(text, hyperlinks) for a w:tc element - the same values extract_document_tables() gives."""
+    r = _w("r")
+    paragraphs = []
+    for p in tc.iterchildren(_w("p")):
+        runs = []
+        for child in p.iterchildren(r, _w("hyperlink")):
+            if child.tag == r:
+                runs.append(_run_text(child))
+            else:
+                runs.extend(_run_text(run) for run in child.iterchildren(r))
+        paragraphs.append("".join(runs))
+    return "\n".join(paragraphs).strip(), cell_hyperlinks(tc, rel_urls)
+
+
+def _stream_row(tr, rel_urls, above):
+    """
+    Cells of a w:tr as python-docx's row.cells sees them: a cell spanning several
+    grid columns repeats once per column, and a vMerge="continue" cell repeats the
+    cell above it. `above` maps grid offset -> (cell, span) for the previous row.
+    Returns (cells, offsets for the next row).
+    """
+    tr_pr = tr.find(_w("trPr"))
+    grid_before = tr_pr.find(_w("gridBefore")) if tr_pr is not None else None
+    offset = int(grid_before.get(_w("val"))) if grid_before is not None else 0
+    
+    cells = []
+    offsets = {}
+    for tc in tr.iterchildren(_w("tc")):
+        tc_pr = tc.find(_w("tcPr"))
+        grid_span = tc_pr.find(_w("gridSpan")) if tc_pr is not None else None
+        v_merge = tc_pr.find(_w("vMerge")) if tc_pr is not None else None
+        span = int(grid_span.get(_w("val"))) if grid_span is not None else 1
+        if v_merge is not None and v_merge.get(_w("val"), "continue") == "continue":
+            if offset not in above:
+                raise ValueError(f"vertically merged cell with no cell above it at grid column {offset}")
+            cell, cell_span = above[offset]
+        else:
+            cell, cell_span = _stream_cell(tc, rel_urls), span
+        cells.extend([cell] * cell_span)
+        offsets[offset] = (cell, cell_span)
+        offset += span
+    return cells, offsets
+
+
+def stream_document_tables(input_file):
+    """
+    Extract all tables from a .docx without python-docx: word/document.xml is
+    streamed with iterparse and each row is turned into cells as soon as it's
+    read, then dropped. Returns the same structure as extract_document_tables().
+    Other package parts (images, styles, ...) are never loaded.
+    """
+    with zipfile.ZipFile(input_file) as package:
+        # The main document part is named in the package relationships
+        document_name = "word/document.xml"
+        package_rels = etree.fromstring(package.read("_rels/.rels"))
+        for rel in package_rels.iter(f"{{{PACKAGE_REL_NS}}}Relationship"):
+            if rel.get("Type", "").endswith("/officeDocument"):
+                document_name = _docx_part_name("", rel.get("Target"))
+        rels_name = _docx_part_name(document_name, f"_rels/{os.path.basename(document_name)}.rels")
+        rel_urls = _docx_hyperlink_rels(package, rels_name)
+        
+        tbl, tr, body = _w("tbl"), _w("tr"), _w("body")
+        tables = []
+        rows = above = None  # Rows of the top-level table being read
+        depth = 0  # Tables open around the current element
+        with package.open(document_name) as stream:
+            # Body-level blocks are paragraphs, tables and content controls - runs and
+            # text inside them are read from the finished row instead of one event each
+            blocks = (tbl, tr, _w("p"), _w("sdt"), _w("sectPr"))
+            for event, element in etree.iterparse(stream, events=("start", "end"), tag=blocks):
+                parent = element.getparent()
+                if element.tag == tbl:
+                    if event == "start":
+                        depth += 1
+                        # Only tables directly in the body count, like doc.tables (not nested ones)
+                        if depth == 1 and parent.tag == body:
+                            rows, above = [], {}
+                    else:
+                        depth -= 1
+                        if depth == 0 and rows is not None:
+                            tables.append(rows)
+                            rows = None
+                elif element.tag == tr and event == "end" and depth == 1 and rows is not None:
+                    cells, above = _stream_row(element, rel_urls, above)
+                    rows.append(cells)
+                    element.clear()
+                
+                if event == "end" and parent is not None and parent.tag == body:
+                    # Finished a top-level block - free it and everything before it
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del parent[0]
+    return tables
+
+
+def read_document_tables(input_file):
+    """
+    Extract all tables from a .docx as (text, hyperlinks) cells, streaming
+    word/document.xml directly and falling back to python-docx when the
+    package is laid out in a way the streaming reader doesn't handle.
+    """
+    try:
+        return stream_document_tables(input_file)
+    except (zipfile.BadZipFile, KeyError, ValueError, etree.XMLSyntaxError) as e:
+        print(f"   ⚠️  Fast document reader failed ({e}) - reading with python-docx")
+        return extract_document_tables(Document(input_file))
+
 def parse_config(tables):
     """Parse the config table (first table with Account Name/Date Created/Month)."""
     config = {"AccountName": "", "DateCreated": "", "Month": ""}
@@ -556,6 +2831,135 @@ def get_week_date_range(week_num, month, year):
     month_abbr = calendar.month_abbr[month]
     return f"{month_abbr} {start_day}-{end_day}"
 
+class Record:
+    """
+    Base for the schedule records (Post, Story, Interaction). Fields live in
+    slots, so records stay small and renderers read them without copying.
+    The document's own names ("Title", "PostDate", ...) still work through
+    get() / [] / update() - see KEYS. A field left as None reads as missing,
+    like a key that was never set.
+    """
+    __slots__ = ()
+    KEYS = {}  # Document key -> field name
+    
+    def get(self, key, default=None):
+        value = getattr(self, self.KEYS[key]) if key in self.KEYS else None
+        return default if value is None else value
+    
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+    
+    def __setitem__(self, key, value):
+        setattr(self, self.KEYS[key], value)
+    
+    def __contains__(self, key):
+        return self.get(key) is not None
+    
+    def update(self, values):
+        for key, value in values.items():
+            self[key] = value
+    
+    def to_dict(self):
+        """The document fields as a plain dict (what the parsed-document cache stores)."""
+        return {key: value for key, name in self.KEYS.items()
+                if name in self.__slots__ and (value := getattr(self, name)) is not None}
+    
+    @classmethod
+    def from_dict(cls, values):
+        """Build a record from document keys (a parsed row or a to_dict() result)."""
+        return cls(**{cls.KEYS[key]: value for key, value in values.items()})
+
+
+@dataclass(slots=True)
+class Post(Record):
+    """A scheduled post, reel or highlight."""
+    title: str | None = None
+    post_date: str | None = None
+    time: str | None = None
+    type: str | None = None
+    status: str | None = None
+    caption: str | None = None
+    hashtags: str | None = None
+    notes: str | None = None
+    media_url: str | None = None
+    
+    # Normalized once the report month is known (see normalize_records)
+    date: datetime | None = None
+    time_24h: str | None = None
+    media_kind: str | None = None  # "image", "video" or None without media
+    
+    # Set by download_all_images - one entry per media URL, in order
+    local_media_urls: list | None = None  # Local paths, or direct URLs for media that didn't download
+    responsive_media: list | None = None
+    media_placeholders: list | None = None
+    media_probes: list | None = None
+    video_thumbnail: str | None = None
+    preview_clip: str | None = None
+    grid_sprite: dict | None = None  # {"sheet", "size", "position"} with GRID_SPRITES
+    
+    KEYS = {"Title": "title", "PostDate": "post_date", "Time": "time", "Type": "type", "Status": "status",
+            "Caption": "caption", "Hashtags": "hashtags", "Notes": "notes", "MediaURL": "media_url"}
+
+
+@dataclass(slots=True)
+class Story(Record):
+    """A scheduled story. Reads as Type "story", Status "Draft" alongside posts."""
+    title: str | None = None
+    post_date: str | None = None
+    time: str | None = None
+    interactive_elements: str | None = None
+    notes: str | None = None
+    media_url: str | None = None
+    type: str = "story"  # Not in the document - lets stories sit alongside posts
+    status: str = "Draft"
+    
+    # Normalized once the report month is known (see normalize_records)
+    date: datetime | None = None
+    time_24h: str | None = None
+    media_kind: str | None = None
+    
+    # Set by download_all_images
+    local_media_url: str | None = None
+    responsive_media: dict | None = None
+    media_placeholder: str | None = None
+    media_probe: dict | None = None
+    
+    KEYS = {"Title": "title", "PostDate": "post_date", "Time": "time", "InteractiveElements": "interactive_elements",
+            "Notes": "notes", "MediaURL": "media_url", "Type": "type", "Status": "status"}
+
+
+@dataclass(slots=True)
+class Interaction(Record):
+    """A row of the engagement plan - the days are "TRUE" / "FALSE"."""
+    account_name: str = ""
+    platform: str = ""
+    interaction_type: str = ""
+    daily_goal: str = ""
+    mon: str = "FALSE"
+    tue: str = "FALSE"
+    wed: str = "FALSE"
+    thu: str = "FALSE"
+    fri: str = "FALSE"
+    sat: str = "FALSE"
+    sun: str = "FALSE"
+    
+    KEYS = {"AccountName": "account_name", "Platform": "platform", "InteractionType": "interaction_type",
+            "DailyGoal": "daily_goal", "Mon": "mon", "Tue": "tue", "Wed": "wed", "Thu": "thu",
+            "Fri": "fri", "Sat": "sat", "Sun": "sun"}
+
+
+def normalize_records(records, year):
+    """Fill in the normalized date, 24h time and media kind of posts / stories for the report year."""
+    for record in records:
+        record.date = parse_date(record.post_date, year) if record.post_date else None
+        record.time_24h = convert_time_to_24hr(record.time or "")
+        if record.media_url:
+            record.media_kind = "video" if is_video_media(record.media_url) else "image"
+
+
 def parse_posts_table(table):
     """Parse the posting schedule table by reading headers dynamically."""
     posts = []
@@ -632,7 +3036,7 @@ def parse_posts_table(table):
             if link and not link.startswith("[") and not post.get("MediaURL"):
                 post["MediaURL"] = link
         
-        posts.append(post)
+        posts.append(Post.from_dict(post))
     return posts
 
 def parse_post_blocks(tables):
@@ -666,7 +3070,7 @@ def parse_post_blocks(tables):
                         post["MediaURL"] = value
             
             if post.get("Title"):
-                posts.append(post)
+                posts.append(Post.from_dict(post))
     
     return posts
 
@@ -719,7 +3123,7 @@ def parse_stories_table(table):
             if link and not link.startswith("["):
                 story["MediaURL"] = link
         
-        stories.append(story)
+        stories.append(Story.from_dict(story))
     return stories
 
 def parse_interactions_table(table):
@@ -743,10 +3147,10 @@ def parse_interactions_table(table):
                 "Sat": "TRUE" if row[9].strip().lower() in ["x", "✓", "✔", "true", "yes"] else "FALSE",
                 "Sun": "TRUE" if row[10].strip().lower() in ["x", "✓", "✔", "true", "yes"] else "FALSE",
             }
-            interactions.append(interaction)
+            interactions.append(Interaction.from_dict(interaction))
     return interactions
 
-def identify_tables(tables, doc):
+def identify_tables(tables, doc=None):
     """Identify which table is which based on content/headers."""
     result = {
         "config": None,
@@ -943,7 +3347,10 @@ def generate_html(config, posts, stories, interactions):
         .posts-grid {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(min(340px, 100%), 1fr)); gap: 32px; margin-bottom: 48px; }}
         .post-card {{ background: var(--bg-secondary); border-radius: 20px; overflow: hidden; box-shadow: 0 1px 3px var(--shadow), 0 8px 32px var(--shadow); transition: all 0.3s ease; }}
         .post-card:hover {{ transform: translateY(-4px); box-shadow: 0 4px 12px var(--shadow-md), 0 16px 48px var(--shadow-md); }}
-        .post-card-media {{ width: 100%; aspect-ratio: 4/5; object-fit: contain; background: #1A1A1A; }}
+        .post-card-media {{ width: 100%; height: auto; object-fit: contain; background: #1A1A1A; }}
+        /* 4:5 box unless the image carries its probed width/height (then the browser reserves that ratio) */
+        .post-card-media:where(:not([height])) {{ aspect-ratio: 4/5; }}
+        .responsive-picture {{ display: contents; }}
         .post-card-media.video-container {{ position: relative; background: #000; }}
         .post-card-media iframe {{ width: 100%; height: 100%; border: none; }}
         .post-card-body {{ padding: 24px; }}
@@ -986,6 +3393,7 @@ def generate_html(config, posts, stories, interactions):
         .video-mute-btn {{ position: absolute; bottom: 16px; right: 16px; width: 32px; height: 32px; background: rgba(0,0,0,0.6); border: none; border-radius: 50%; display: flex; align-items: center; justify-content: center; cursor: pointer; transition: all 0.2s ease; z-index: 10; }}
         .video-mute-btn:hover {{ background: rgba(0,0,0,0.8); transform: scale(1.1); }}
         .video-mute-btn svg {{ width: 16px; height: 16px; stroke: white; }}
+        .video-original-link {{ position: absolute; top: 12px; left: 12px; padding: 4px 10px; background: rgba(0,0,0,0.6); color: white; border-radius: 12px; font-size: 11px; text-decoration: none; z-index: 10; }}
         .video-mute-btn .unmute-icon {{ display: none; }}
         .video-mute-btn .mute-icon {{ display: block; }}
         .video-player-container.unmuted .video-mute-btn .unmute-icon {{ display: block; }}
@@ -1270,11 +3678,8 @@ def generate_html(config, posts, stories, interactions):
         .ig-grid-item {{ position: relative; aspect-ratio: 1; cursor: pointer; overflow: hidden; background: #1A1A1A; }}
         .ig-grid-item:hover .ig-grid-overlay {{ opacity: 1; }}
         .ig-grid-thumb {{ width: 100%; height: 100%; object-fit: cover; transition: transform 0.3s ease; }}
+        .ig-sprite {{ width: 100%; height: 100%; background-repeat: no-repeat; }}
         .ig-grid-item:hover .ig-grid-thumb {{ transform: scale(1.05); }}
-        .ig-video-thumb {{ position: relative; width: 100%; height: 100%; background: linear-gradient(135deg, #1A1A1A 0%, #2D2D2D 100%); }}
-        .ig-thumb-loading {{ position: absolute; inset: 0; display: flex; align-items: center; justify-content: center; color: var(--accent-warm); }}
-        .ig-thumb-canvas {{ width: 100%; height: 100%; object-fit: cover; opacity: 0; transition: opacity 0.3s ease; }}
-        .ig-thumb-error .ig-thumb-loading {{ display: flex; }}
         .ig-no-media {{ display: flex; align-items: center; justify-content: center; background: var(--bg-primary); color: var(--text-muted); font-size: 12px; }}
         .ig-type-icon {{ position: absolute; top: 8px; right: 8px; width: 20px; height: 20px; filter: drop-shadow(0 1px 2px rgba(0,0,0,0.5)); }}
         .ig-grid-overlay {{ position: absolute; inset: 0; background: rgba(0,0,0,0.6); display: flex; flex-direction: column; align-items: center; justify-content: center; opacity: 0; transition: opacity 0.2s ease; padding: 12px; text-align: center; }}
@@ -1291,6 +3696,7 @@ def generate_html(config, posts, stories, interactions):
         .ig-modal-image {{ max-width: 100%; max-height: 80vh; object-fit: contain; }}
         .ig-modal-video {{ width: 100%; height: 100%; }}
         .ig-modal-video video {{ width: 100%; height: 100%; max-height: 80vh; object-fit: contain; }}
+        .ig-modal-original {{ display: block; padding: 8px 12px; color: var(--accent-warm); font-size: 12px; text-align: center; }}
         .ig-modal-no-media {{ color: var(--text-muted); padding: 40px; }}
         .ig-modal-details {{ width: 340px; flex-shrink: 0; padding: 24px; overflow-y: auto; max-height: 80vh; }}
         .ig-modal-header {{ display: flex; justify-content: space-between; align-items: flex-start; gap: 12px; margin-bottom: 16px; }}
@@ -1424,7 +3830,7 @@ def generate_html(config, posts, stories, interactions):
                         {"".join(f'''<tr>
                             <td><strong>{p.get("Title", "")}</strong></td>
                             <td data-sort="{convert_date_to_sortable(p.get("PostDate", ""))}">{p.get("PostDate", "")}</td>
-                            <td data-sort="{convert_time_to_24hr(p.get("Time", ""))}">{p.get("Time", "")}</td>
+                            <td data-sort="{p.time_24h}">{p.get("Time", "")}</td>
                             <td data-sort="{p.get("Type", "post")}"><span class="type-badge type-{p.get("Type", "post").lower()}">{p.get("Type", "post")}</span></td>
                             <td data-sort="{p.get("Status", "Draft")}"><span class="status status-{p.get("Status", "Draft").lower().replace(" ", "")}">{p.get("Status", "Draft")}</span></td>
                             <td style="max-width: 200px; font-size: 13px; color: var(--text-muted);">{p.get("Hashtags", "")}</td>
@@ -1826,14 +4232,19 @@ def render_post_card(post, index):
     
     media_field = post.get("MediaURL", "")
     
-    # Check for video first - includes YouTube, Vimeo, AND video file extensions
+    # Check for video first - YouTube/Vimeo embeds, then video files (probed type, else extension)
     video_platforms = ["youtube.com", "youtu.be", "vimeo.com"]
     video_extensions = [".mov", ".mp4", ".webm", ".avi", ".mkv", ".m4v"]
+    probes = post.media_probes or [None]
     
     is_platform_video = any(x in media_field.lower() for x in video_platforms)
-    is_file_video = any(media_field.lower().endswith(ext) or f"{ext}?" in media_field.lower() or f"{ext}&" in media_field.lower() for ext in video_extensions)
-    # Also check for Dropbox preview parameter with video files
-    is_dropbox_video = "dropbox.com" in media_field.lower() and "preview=" in media_field.lower() and any(ext in media_field.lower() for ext in video_extensions)
+    if probes[0]:
+        is_file_video = probes[0]["kind"] == "video"
+        is_dropbox_video = False
+    else:
+        is_file_video = any(media_field.lower().endswith(ext) or f"{ext}?" in media_field.lower() or f"{ext}&" in media_field.lower() for ext in video_extensions)
+        # Also check for Dropbox preview parameter with video files
+        is_dropbox_video = "dropbox.com" in media_field.lower() and "preview=" in media_field.lower() and any(ext in media_field.lower() for ext in video_extensions)
     
     is_video = is_platform_video or is_file_video or is_dropbox_video
     
@@ -1842,24 +4253,34 @@ def render_post_card(post, index):
             embed_url = get_embed_url(media_field)
             media_html = f'<div class="post-card-media video-container"><iframe src="{embed_url}" allowfullscreen></iframe></div>'
         else:
-            # For direct video files (Dropbox, etc.), use HTML5 video player
+            # For direct video files (Dropbox, etc.), use HTML5 video player - with a
+            # server-side poster frame nothing is fetched until the reader presses play
             video_url = get_direct_video_url(media_field)
+            poster = post.video_thumbnail
+            poster_attrs = f'preload="none" poster="{poster}"' if poster else 'preload="metadata"'
             filename = extract_filename_from_url(media_field)
-            # Determine video type from extension
+            # Determine video type from the probe, else the extension
             video_type = "video/mp4"  # Default
-            if ".mov" in media_field.lower():
+            if probes[0]:
+                video_type = probes[0]["mime"]
+            elif ".mov" in media_field.lower():
                 video_type = "video/quicktime"
             elif ".webm" in media_field.lower():
                 video_type = "video/webm"
             elif ".avi" in media_field.lower():
                 video_type = "video/x-msvideo"
             
+            # A preview clip (--preview-clips) plays first, the original stays a link away
+            clip = post.preview_clip
+            clip_source = f'<source src="{clip}" type="video/mp4">' if clip else ''
+            original_link = f'<a class="video-original-link" href="{video_url}" target="_blank" rel="noopener" onclick="event.stopPropagation()">Original ↗</a>' if clip else ''
+            
             media_html = f'''<div class="post-card-media video-player-container" onclick="toggleVideoPlay(this)">
-                <video class="video-player" playsinline preload="metadata" muted loop poster="">
-                    <source src="{video_url}" type="{video_type}">
+                <video class="video-player" playsinline {poster_attrs} muted loop>
+                    {clip_source}<source src="{video_url}" type="{video_type}">
                     <source src="{video_url}" type="video/mp4">
                     Your browser does not support the video tag.
-                </video>
+                </video>{original_link}
                 <div class="video-play-indicator">
                     <svg viewBox="0 0 24 24" fill="white"><polygon points="5 3 19 12 5 21 5 3"/></svg>
                 </div>
@@ -1880,12 +4301,20 @@ def render_post_card(post, index):
     else:
         # Parse multiple URLs (carousel support) - pass post for local paths
         media_urls = parse_media_urls(media_field, post)
+        responsive_media = post.responsive_media or [None] * len(media_urls)
+        probes = post.media_probes or [None] * len(media_urls)
+        placeholders = post.media_placeholders or [None] * len(media_urls)
+        card_sizes = "(max-width: 640px) 100vw, 400px"
         
         if len(media_urls) > 1:
             # Carousel with multiple images - use cleaned title for alt attribute
-            slides_html = ''.join(f'''<div class="carousel-slide" data-index="{i}">
-                <img src="{url}" alt="{post_title_clean} - Image {i+1}" onerror="this.parentElement.innerHTML='<div class=\\'no-media\\'>Image not available</div>'">
-            </div>''' for i, url in enumerate(media_urls))
+            slides = []
+            for i, (url, responsive, probe, placeholder) in enumerate(zip(media_urls, responsive_media, probes, placeholders)):
+                img_html = render_responsive_img(url, responsive, card_sizes, f'{dimension_attrs(probe)}{placeholder_attrs(placeholder)}alt="{post_title_clean} - Image {i+1}" onerror="this.parentElement.innerHTML=\'<div class=\\\'no-media\\\'>Image not available</div>\'"')
+                slides.append(f'''<div class="carousel-slide" data-index="{i}">
+                {img_html}
+            </div>''')
+            slides_html = ''.join(slides)
             
             dots_html = ''.join(f'<span class="carousel-dot{" active" if i == 0 else ""}" data-index="{i}" onclick="goToSlide(this, {i})"></span>' for i in range(len(media_urls)))
             
@@ -1902,7 +4331,7 @@ def render_post_card(post, index):
             </div>'''
         elif len(media_urls) == 1:
             # Single image - add referrerpolicy for better mobile Dropbox support
-            media_html = f'<img class="post-card-media" src="{media_urls[0]}" alt="{post.get("Title", "")}" onerror="this.outerHTML=\'<div class=\\\'no-media\\\'>Image not available</div>\'">'
+            media_html = render_responsive_img(media_urls[0], responsive_media[0], card_sizes, f'class="post-card-media" {dimension_attrs(probes[0])}{placeholder_attrs(placeholders[0])}alt="{post.get("Title", "")}" onerror="this.outerHTML=\'<div class=\\\'no-media\\\'>Image not available</div>\'"')
         else:
             media_html = '<div class="no-media">No media uploaded</div>'
     
@@ -1971,27 +4400,12 @@ def render_monthly_calendar(posts, stories, month, year):
     # Build a dict of day -> items for quick lookup (combine posts + stories)
     items_by_day = {}
     
-    # Add posts
-    for post in posts:
-        post_date = parse_date(post.get("PostDate", ""), year)
-        if post_date and post_date.month == month and post_date.year == year:
-            day = post_date.day
-            if day not in items_by_day:
-                items_by_day[day] = []
-            item = post.copy()
-            item["_content_type"] = "post"
-            items_by_day[day].append(item)
-    
-    # Add stories
-    for story in stories:
-        story_date = parse_date(story.get("PostDate", ""), year)
-        if story_date and story_date.month == month and story_date.year == year:
-            day = story_date.day
+    # Stories read as Type "story" for styling
+    for item in posts + stories:
+        if item.date and item.date.month == month and item.date.year == year:
+            day = item.date.day
             if day not in items_by_day:
                 items_by_day[day] = []
-            item = story.copy()
-            item["_content_type"] = "story"
-            item["Type"] = "story"  # Mark as story type for styling
             items_by_day[day].append(item)
     
     # Day headers
@@ -2080,25 +4494,11 @@ def render_monthly_calendar(posts, stories, month, year):
 
 def render_weekly_view(posts, stories, month, year):
     """Render a detailed weekly breakdown showing all posts and stories by week."""
-    # Combine posts and stories
-    all_items = []
-    for post in posts:
-        item = post.copy()
-        item["_content_type"] = "post"
-        all_items.append(item)
-    for story in stories:
-        item = story.copy()
-        item["_content_type"] = "story"
-        item["Type"] = "story"
-        item["Status"] = "Draft"
-        all_items.append(item)
-    
-    # Build items by day for quick lookup
+    # Build items by day for quick lookup (stories read as Type "story", Status "Draft")
     items_by_day = {}
-    for item in all_items:
-        item_date = parse_date(item.get("PostDate", ""), year)
-        if item_date and item_date.month == month and item_date.year == year:
-            day = item_date.day
+    for item in posts + stories:
+        if item.date and item.date.month == month and item.date.year == year:
+            day = item.date.day
             if day not in items_by_day:
                 items_by_day[day] = []
             items_by_day[day].append(item)
@@ -2220,9 +4620,8 @@ def render_posts_by_week_carousel(posts, month, year):
     # Build posts by day for quick lookup (only posts, not stories)
     posts_by_day = {}
     for i, post in enumerate(posts):
-        post_date = parse_date(post.get("PostDate", ""), year)
-        if post_date and post_date.month == month and post_date.year == year:
-            day = post_date.day
+        if post.date and post.date.month == month and post.date.year == year:
+            day = post.date.day
             if day not in posts_by_day:
                 posts_by_day[day] = []
             posts_by_day[day].append((i, post))
@@ -2302,7 +4701,7 @@ def render_posts_by_week_carousel(posts, month, year):
 
 def render_story_card(story, index):
     """Render a single story card with full-size image (like posts)."""
-    media_url = story.get("_local_media_url") or get_direct_image_url(story.get("MediaURL", ""))
+    media_url = story.local_media_url or get_direct_image_url(story.get("MediaURL", ""))
     title = story.get("Title", "Untitled")
     post_date = story.get("PostDate", "")
     post_time = story.get("Time", "")
@@ -2312,7 +4711,9 @@ def render_story_card(story, index):
     date_display = f"{post_date} • {post_time}" if post_date and post_time else post_date or post_time or ""
     
     if media_url:
-        media_html = f'<img class="post-card-media" src="{media_url}" alt="{title}" style="aspect-ratio: 9/16; object-fit: contain; background: #1A1A1A;" onerror="this.outerHTML=\'<div class=\\\'no-media\\\'>Image not available</div>\'">'
+        dimensions = dimension_attrs(story.media_probe)
+        style = "object-fit: contain; background: #1A1A1A;" if dimensions else "aspect-ratio: 9/16; object-fit: contain; background: #1A1A1A;"
+        media_html = render_responsive_img(media_url, story.responsive_media, "(max-width: 640px) 100vw, 400px", f'class="post-card-media" {dimensions}alt="{title}" {placeholder_attrs(story.media_placeholder, style=style)}onerror="this.outerHTML=\'<div class=\\\'no-media\\\'>Image not available</div>\'"')
     else:
         media_html = '<div class="no-media" style="aspect-ratio: 9/16;">No media uploaded</div>'
     
@@ -2334,9 +4735,8 @@ def render_stories_by_week(stories, month, year):
     """Render stories grouped by week with carousel + table for each week."""
     stories_by_day = {}
     for i, story in enumerate(stories):
-        story_date = parse_date(story.get("PostDate", ""), year)
-        if story_date and story_date.month == month and story_date.year == year:
-            day = story_date.day
+        if story.date and story.date.month == month and story.date.year == year:
+            day = story.date.day
             if day not in stories_by_day:
                 stories_by_day[day] = []
             stories_by_day[day].append((i, story))
@@ -2423,6 +4823,12 @@ def render_stories_by_week(stories, month, year):
     return weeks_html
 
 
+def render_sprite_tile(sprite, title, css_class):
+    """One grid tile cut from a sprite sheet (see build_grid_sprites)."""
+    return (f'<div class="{css_class}" role="img" aria-label="{title}" style="background-image: url({sprite["sheet"]}); '
+            f'background-size: {sprite["size"]}; background-position: {sprite["position"]};"></div>')
+
+
 def render_instagram_grid(posts, year):
     """
     Render an Instagram-style 3-column grid preview.
@@ -2445,18 +4851,24 @@ def render_instagram_grid(posts, year):
         media_urls = parse_media_urls(media_field, post)
         
         # Check if this is a video
-        video_extensions = [".mov", ".mp4", ".webm", ".avi", ".mkv", ".m4v"]
-        is_video = any(ext in media_field.lower() for ext in video_extensions) or post_type == "reel"
+        probe = (post.media_probes or [None])[0]
+        placeholder = (post.media_placeholders or [None])[0]
+        is_video = is_video_media(media_field, probe) or post_type == "reel"
+        sprite = post.grid_sprite  # Set with --grid-sprites
         
         if media_urls:
             first_url = media_urls[0]
             if is_video:
                 # Use extracted video thumbnail if available, otherwise show play icon
-                video_thumb = post.get("_video_thumbnail")
-                if video_thumb:
-                    # Use the extracted thumbnail image
+                video_thumb = post.video_thumbnail
+                if sprite or video_thumb:
+                    # Use the extracted thumbnail image (or its sprite tile)
+                    if sprite:
+                        frame_html = render_sprite_tile(sprite, title, "ig-sprite")
+                    else:
+                        frame_html = f'<img src="{video_thumb}" alt="{title}" loading="lazy" {placeholder_attrs(placeholder, "cover", "width:100%;height:100%;object-fit:cover;")}>'
                     thumbnail_html = f'''<div class="ig-grid-thumb" style="position: relative;">
-                        <img src="{video_thumb}" alt="{title}" loading="lazy" style="width:100%;height:100%;object-fit:cover;">
+                        {frame_html}
                         <div style="position:absolute;top:50%;left:50%;transform:translate(-50%,-50%);width:40px;height:40px;background:rgba(0,0,0,0.5);border-radius:50%;display:flex;align-items:center;justify-content:center;">
                             <svg width="16" height="16" viewBox="0 0 24 24" fill="white"><polygon points="5 3 19 12 5 21 5 3"/></svg>
                         </div>
@@ -2466,9 +4878,12 @@ def render_instagram_grid(posts, year):
                     thumbnail_html = '''<div class="ig-grid-thumb ig-no-media" style="background:linear-gradient(135deg, #1A1A1A 0%, #2D2D2D 100%);">
                         <svg width="32" height="32" viewBox="0 0 24 24" fill="none" stroke="#C4A484" stroke-width="2"><polygon points="5 3 19 12 5 21 5 3" fill="#C4A484"/></svg>
                     </div>'''
+            elif sprite:
+                thumbnail_html = render_sprite_tile(sprite, title, "ig-grid-thumb ig-sprite")
             else:
                 # Image thumbnail
-                thumbnail_html = f'<img class="ig-grid-thumb" src="{first_url}" alt="{title}" loading="lazy">'
+                responsive = (post.responsive_media or [None])[0]
+                thumbnail_html = render_responsive_img(first_url, responsive, "(max-width: 900px) 33vw, 300px", f'class="ig-grid-thumb" {dimension_attrs(probe)}{placeholder_attrs(placeholder, "cover")}alt="{title}" loading="lazy"')
         else:
             thumbnail_html = '<div class="ig-grid-thumb ig-no-media"><span>No media</span></div>'
         
@@ -2513,8 +4928,11 @@ def render_instagram_grid(posts, year):
             'hashtags': p.get('Hashtags', ''),
             'status': p.get('Status', 'Draft'),
             'media': parse_media_urls(p.get('MediaURL', ''), p),
-            'isVideo': any(ext in p.get('MediaURL', '').lower() for ext in ['.mov', '.mp4', '.webm', '.avi', '.mkv', '.m4v']) or p.get('Type', '').lower() == 'reel',
-            'videoUrl': get_direct_video_url(p.get('MediaURL', '')) if any(ext in p.get('MediaURL', '').lower() for ext in ['.mov', '.mp4', '.webm', '.avi', '.mkv', '.m4v']) else ''
+            'isVideo': is_video_media(p.get('MediaURL', ''), (p.media_probes or [None])[0]) or p.get('Type', '').lower() == 'reel',
+            'videoUrl': get_direct_video_url(p.get('MediaURL', '')) if is_video_media(p.get('MediaURL', ''), (p.media_probes or [None])[0]) else '',
+            'videoType': ((p.media_probes or [None])[0] or {}).get('mime', 'video/mp4'),
+            'poster': p.video_thumbnail or '',
+            'clipUrl': p.preview_clip or ''
         } for i, p in enumerate(sorted_posts)])};
         
         function openGridPost(index) {{
@@ -2525,9 +4943,11 @@ def render_instagram_grid(posts, year):
             let mediaHtml;
             if (post.isVideo && post.videoUrl) {{
                 mediaHtml = `<div class="ig-modal-video">
-                    <video controls autoplay muted playsinline>
-                        <source src="${{post.videoUrl}}" type="video/mp4">
+                    <video controls autoplay muted playsinline poster="${{post.poster}}">
+                        ${{post.clipUrl ? `<source src="${{post.clipUrl}}" type="video/mp4">` : ''}}
+                        <source src="${{post.videoUrl}}" type="${{post.videoType}}">
                     </video>
+                    ${{post.clipUrl ? `<a class="ig-modal-original" href="${{post.videoUrl}}" target="_blank" rel="noopener">Open original video ↗</a>` : ''}}
                 </div>`;
             }} else if (post.media && post.media.length > 0) {{
                 mediaHtml = `<img class="ig-modal-image" src="${{post.media[0]}}" alt="${{post.title}}">`;
@@ -2566,43 +4986,6 @@ def render_instagram_grid(posts, year):
         document.addEventListener('keydown', (e) => {{
             if (e.key === 'Escape') closeGridPost();
         }});
-        
-        // Generate video thumbnails
-        document.addEventListener('DOMContentLoaded', () => {{
-            document.querySelectorAll('.ig-video-thumb').forEach(thumb => {{
-                const videoUrl = thumb.dataset.videoUrl;
-                const canvas = thumb.querySelector('.ig-thumb-canvas');
-                const ctx = canvas.getContext('2d');
-                
-                const video = document.createElement('video');
-                video.crossOrigin = 'anonymous';
-                video.muted = true;
-                video.preload = 'metadata';
-                
-                video.addEventListener('loadeddata', () => {{
-                    video.currentTime = 0.5; // Seek to 0.5 seconds for thumbnail
-                }});
-                
-                video.addEventListener('seeked', () => {{
-                    // Draw frame to canvas
-                    const size = Math.min(video.videoWidth, video.videoHeight);
-                    const sx = (video.videoWidth - size) / 2;
-                    const sy = (video.videoHeight - size) / 2;
-                    ctx.drawImage(video, sx, sy, size, size, 0, 0, 300, 300);
-                    
-                    // Show canvas, hide loading
-                    canvas.style.opacity = '1';
-                    thumb.querySelector('.ig-thumb-loading').style.display = 'none';
-                }});
-                
-                video.addEventListener('error', () => {{
-                    // Keep showing the play icon on error
-                    thumb.classList.add('ig-thumb-error');
-                }});
-                
-                video.src = videoUrl;
-            }});
-        }});
     </script>'''
 
 
@@ -2899,12 +5282,54 @@ def get_direct_image_url(url):
     return url
 
 
+def is_dropbox_host(host):
+    """True for dropbox.com, dropboxusercontent.com and their subdomains (not lookalikes like notdropbox.com)."""
+    host = (host or "").lower()
+    return any(host == domain or host.endswith("." + domain) for domain in ("dropbox.com", "dropboxusercontent.com"))
+
+
+def canonical_media_url(url):
+    """
+    One spelling per media file, used for every cache/dedup key and filename hash
+    (never fetched - use get_direct_image_url / get_direct_video_url for that).
+    
+    Builds on get_direct_video_url / get_direct_image_url, then:
+        - lowercases scheme and host, drops default ports and #fragments
+        - maps every Dropbox host (www., bare, dl., dl.dropboxusercontent.com)
+          to dl.dropboxusercontent.com and drops its st=, e=, dl= and raw=
+        - sorts the remaining query parameters
+    So ...dropbox.com/scl/fi/x/a.jpg?rlkey=K&st=abc&dl=0 and
+    ...dl.dropboxusercontent.com/scl/fi/x/a.jpg?raw=1&rlkey=K share one entry.
+    """
+    if not url:
+        return url
+    
+    url = url.strip()
+    # The direct-URL helpers match "dropbox.com" anywhere in the URL - keep lookalike
+    # hosts (notdropbox.com) and URLs that merely mention Dropbox out of them
+    if "dropbox.com" not in url or is_dropbox_host(urlsplit(url).hostname):
+        url = get_direct_image_url(get_direct_video_url(url))
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    
+    if is_dropbox_host(host):
+        host = "dl.dropboxusercontent.com"
+        query = [(name, value) for name, value in query if name not in ("st", "e", "dl", "raw")]
+    
+    netloc = host
+    if parts.port and parts.port != {"http": 80, "https": 443}.get(scheme):
+        netloc = f"{host}:{parts.port}"
+    return urlunsplit((scheme, netloc, parts.path or "/", urlencode(sorted(query)), ""))
+
+
 def parse_media_urls(media_field, post=None):
     """
     Parse a media URL field that may contain multiple URLs.
     Returns a list of direct image URLs or local paths.
     
-    If post is provided and has _local_media_urls, use those instead.
+    If post is provided and has local_media_urls (downloaded media), use those instead.
     
     Handles:
         - Single URL
@@ -2912,8 +5337,8 @@ def parse_media_urls(media_field, post=None):
         - URLs with descriptive text (e.g., "https://... - Album")
     """
     # Check if we have local downloaded images
-    if post and "_local_media_urls" in post:
-        return post["_local_media_urls"]
+    if post and post.local_media_urls is not None:
+        return post.local_media_urls
     
     if not media_field:
         return []
@@ -2946,31 +5371,22 @@ def parse_media_urls(media_field, post=None):
     
     return urls
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python generate_report.py input.docx [output.html]")
-        print("\nThis script reads a Word document and generates an HTML report.")
-        sys.exit(1)
-    
-    input_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else input_file.replace(".docx", "_report.html")
-    
-    if not os.path.exists(input_file):
-        print(f"Error: File '{input_file}' not found.")
-        sys.exit(1)
-    
-    print(f"📄 Reading: {input_file}")
-    
-    # Load document
-    doc = Document(input_file)
-    tables = extract_tables(doc)
-    tables_with_hyperlinks = extract_tables_with_hyperlinks(doc)
+def parse_document(input_file):
+    """
+    Read a schedule .docx into {"config", "posts", "stories", "interactions"}
+    (Post / Story / Interaction records), with post detail blocks already
+    merged into the posts.
+    """
+    # Load document - every cell is read once, for both its text and its hyperlinks
+    document_tables = read_document_tables(input_file)
+    tables = [table_text(table) for table in document_tables]
+    tables_with_hyperlinks = [table_values(table) for table in document_tables]
     
     print(f"   Found {len(tables)} tables")
     
-    # Identify tables using hyperlink-aware extraction for posts schedule
-    # This ensures Photo Links column gets the actual URLs from hyperlinks
-    identified = identify_tables(tables_with_hyperlinks, doc)
+    # Identify tables using hyperlink-aware extraction, so the Photo Links column
+    # and post detail blocks get the actual URLs from hyperlinks
+    identified = identify_tables(tables_with_hyperlinks)
     
     config = parse_config(tables)
     print(f"   Config: {config}")
@@ -2982,12 +5398,8 @@ def main():
         print(f"   Posts from schedule: {len(posts)}")
     
     # Merge with post detail blocks (for captions/media)
-    # Use tables_with_hyperlinks instead of regular tables to get embedded URLs
-    # Re-identify post_blocks using the hyperlink-aware tables
-    identified_with_hyperlinks = identify_tables(tables_with_hyperlinks, doc)
-    
     post_blocks = []
-    for block in identified_with_hyperlinks["post_blocks"]:
+    for block in identified["post_blocks"]:
         block_data = {}
         post_type = "post"
         for row in block:
@@ -3024,7 +5436,7 @@ def main():
                 matched = True
                 break
         if not matched:
-            posts.append(block)
+            posts.append(Post.from_dict(block))
     
     print(f"   Total posts after merge: {len(posts)}")
     
@@ -3040,6 +5452,167 @@ def main():
         interactions = parse_interactions_table(identified["interactions"])
     print(f"   Interactions: {len(interactions)}")
     
+    return {"config": config, "posts": posts, "stories": stories, "interactions": interactions}
+
+
+def document_cache_path(content_hash):
+    """Path of the parsed-document cache entry for a .docx content hash."""
+    return os.path.join(MEDIA_CACHE_DIR, "documents", f"{content_hash}.json")
+
+
+def load_document(input_file):
+    """
+    parse_document() with a cache keyed by the .docx content hash and
+    PARSER_VERSION - an unchanged document isn't opened again. The cache
+    holds the document fields; records are normalized after loading, so
+    the dates follow the report month on every run.
+    """
+    if not DOCUMENT_CACHE:
+        return normalize_document(parse_document(input_file))
+    
+    content_hash = file_sha256(input_file)
+    cache_path = document_cache_path(content_hash)
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = None
+    
+    document = None
+    try:
+        if cached and cached.get("parser_version") == PARSER_VERSION:
+            cached = cached["document"]
+            document = {"config": dict(cached["config"]),
+                        "posts": [Post.from_dict(post) for post in cached["posts"]],
+                        "stories": [Story.from_dict(story) for story in cached["stories"]],
+                        "interactions": [Interaction.from_dict(interaction) for interaction in cached["interactions"]]}
+    except Exception:
+        document = None  # Readable JSON but not the shape we write - parse the document again
+    if document is not None:
+        os.utime(cache_path)  # Mark it recently used
+        print(f"   ♻️  Unchanged since last run - using the parsed document from cache")
+        print(f"   Config: {document['config']}")
+        print(f"   Posts: {len(document['posts'])}")
+        print(f"   Stories: {len(document['stories'])}")
+        print(f"   Interactions: {len(document['interactions'])}")
+        return normalize_document(document)
+    
+    document = parse_document(input_file)
+    cached = {"config": document["config"],
+              "posts": [post.to_dict() for post in document["posts"]],
+              "stories": [story.to_dict() for story in document["stories"]],
+              "interactions": [interaction.to_dict() for interaction in document["interactions"]]}
+    try:
+        save_document_cache(cache_path, {"parser_version": PARSER_VERSION, "parsed_at": time.time(), "document": cached})
+    except (OSError, TypeError, ValueError) as e:  # TypeError / ValueError: a field json can't write
+        print(f"   ⚠️  Couldn't cache the parsed document: {e}")
+    return normalize_document(document)
+
+
+def normalize_document(document):
+    """Normalize a parsed document's posts and stories for the report month (see normalize_records)."""
+    month, year = parse_month_year(document["config"].get("Month", ""))
+    normalize_records(document["posts"] + document["stories"], year)
+    return document
+
+
+def save_document_cache(cache_path, entry):
+    """Write a parsed-document cache entry atomically, then drop the oldest past DOCUMENT_CACHE_ENTRIES."""
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith(".json")]
+    entries.sort(key=os.path.getmtime, reverse=True)
+    for path in entries[DOCUMENT_CACHE_ENTRIES:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def write_report(output_file, html):
+    """Write the report atomically - a browser reloading it never sees half a file."""
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    os.makedirs(output_dir, exist_ok=True)  # A progressive preview is written before downloads create it
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(html)
+        os.chmod(tmp_path, NEW_FILE_MODE)
+        os.replace(tmp_path, output_file)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def open_in_browser(output_file):
+    """Open a written report in the default browser."""
+    webbrowser.open(pathlib.Path(output_file).resolve().as_uri())
+
+
+def main():
+    global RECHECK_FAILURES, GRID_SPRITES, PREVIEW_CLIPS
+    
+    # Options (--name) can go anywhere; the rest are the positional file arguments
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    options = {arg for arg in sys.argv[1:] if arg.startswith("--")}
+    unknown = options - {"--recheck-failures", "--progressive", "--open", "--grid-sprites", "--preview-clips"}
+    
+    if len(args) < 1 or unknown:
+        if unknown:
+            print(f"Unknown option: {', '.join(sorted(unknown))}\n")
+        print("Usage: python generate_report.py input.docx [output.html] [--recheck-failures] [--progressive] [--open] [--grid-sprites] [--preview-clips]")
+        print("\nThis script reads a Word document and generates an HTML report.")
+        print("  --recheck-failures   Retry media URLs that failed on a previous run")
+        print("  --progressive        Write the report right away, then again with local media")
+        print("  --open               Open the report in the browser as soon as it's written")
+        print("  --grid-sprites       Draw the Instagram grid preview from a few sprite sheets")
+        print("  --preview-clips      Play short, small H.264 loops of post videos in the report")
+        sys.exit(1)
+    
+    RECHECK_FAILURES = "--recheck-failures" in options
+    GRID_SPRITES = "--grid-sprites" in options
+    PREVIEW_CLIPS = "--preview-clips" in options
+    progressive = "--progressive" in options
+    open_report = "--open" in options
+    
+    input_file = args[0]
+    output_file = args[1] if len(args) > 1 else input_file.replace(".docx", "_report.html")
+    
+    if not os.path.exists(input_file):
+        print(f"Error: File '{input_file}' not found.")
+        sys.exit(1)
+    
+    print(f"📄 Reading: {input_file}")
+    
+    document = load_document(input_file)
+    config, posts, stories, interactions = (document["config"], document["posts"],
+                                            document["stories"], document["interactions"])
+    
+    # Progressive mode: a usable report right away, with media straight from the
+    # direct URLs - it's rewritten with local media once downloads finish
+    opened = False
+    if progressive and DOWNLOAD_IMAGES:
+        write_report(output_file, generate_html(config, posts, stories, interactions))
+        print(f"\n📝 Preview written: {output_file} (media loads from the web until downloads finish)", flush=True)
+        if open_report:
+            open_in_browser(output_file)
+            opened = True
+    
     # Download images to local folder
     output_dir = os.path.dirname(os.path.abspath(output_file))
     download_all_images(posts, stories, output_dir)
@@ -3048,11 +5621,15 @@ def main():
     html = generate_html(config, posts, stories, interactions)
     
     # Write output
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write(html)
+    write_report(output_file, html)
     
     print(f"\n✅ Report generated: {output_file}")
-    print(f"   Open in any browser to view!")
+    if opened:
+        print(f"   Reload the browser tab to see local media")
+    elif open_report:
+        open_in_browser(output_file)
+    else:
+        print(f"   Open in any browser to view!")
 
 if __name__ == "__main__":
     main()
@@ -8,6 +8,7 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import os
 import sys
+import subprocess
 import webbrowser
 import threading
 
@@ -160,37 +161,64 @@ class ReportGeneratorGUI:
             input_file = self.input_file.get()
             output_file = self.output_file.get()
             
-            # Build command - use sys.executable to ensure same Python interpreter
+            # Build command - use sys.executable to ensure same Python interpreter.
+            # -u streams progress lines as they're printed; --progressive writes a
+            # preview with web media first, then rewrites it with local media
             script_path = os.path.join(os.path.dirname(__file__), 'generate_report.py')
-            cmd = [sys.executable, script_path, input_file]
+            cmd = [sys.executable, '-u', script_path, input_file]
             if output_file:
                 cmd.append(output_file)
+            cmd.append('--progressive')
+            output_file = output_file or input_file.replace('.docx', '_report.html')
             
-            # Run the script
-            result = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(__file__))
+            # Run the script, showing its progress in the status line
+            env = dict(os.environ, PYTHONIOENCODING='utf-8')
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, encoding='utf-8', errors='replace',
+                                       cwd=os.path.dirname(__file__), env=env)
+            lines = []
+            preview_ready = False
+            for line in process.stdout:
+                line = line.strip()
+                if not line:
+                    continue
+                lines.append(line)
+                self.root.after(0, lambda text=line: self.status_label.config(text=text[:60], fg='#F57C00'))
+                if line.startswith("📝 Preview written") and not preview_ready:
+                    preview_ready = True
+                    self.root.after(0, lambda: self._on_preview_ready(output_file))
+            returncode = process.wait()
             
             # Update UI in main thread
-            self.root.after(0, lambda: self._on_generation_complete(result, output_file or input_file.replace('.docx', '_report.html')))
+            output = "\n".join(lines)
+            self.root.after(0, lambda: self._on_generation_complete(returncode, output, output_file, preview_ready))
             
         except Exception as e:
             self.root.after(0, lambda: self._on_generation_error(str(e)))
     
-    def _on_generation_complete(self, result, output_file):
+    def _on_preview_ready(self, output_file):
+        if self.auto_open.get() and os.path.exists(output_file):
+            webbrowser.open('file://' + os.path.abspath(output_file))
+    
+    def _on_generation_complete(self, returncode, output, output_file, preview_opened=False):
         self.progress.stop()
         self.progress.pack_forget()
         self.generate_btn.config(state='normal', text="Generate Report")
         
-        if result.returncode == 0:
+        if returncode == 0:
             self.status_label.config(text="✓ Report generated successfully!", fg='#2E7D32')
             
+            if preview_opened and self.auto_open.get():
+                messagebox.showinfo("Success", f"Report generated!\n\n{output_file}\n\nReload the browser tab to see local media.")
+                return
+            
             if self.auto_open.get() and os.path.exists(output_file):
                 webbrowser.open('file://' + os.path.abspath(output_file))
             
             messagebox.showinfo("Success", f"Report generated!\n\n{output_file}")
         else:
             self.status_label.config(text="✗ Error generating report", fg='#C62828')
-            error_msg = result.stderr if result.stderr else result.stdout
-            messagebox.showerror("Error", f"Failed to generate report:\n\n{error_msg[:500]}")
+            messagebox.showerror("Error", f"Failed to generate report:\n\n{output[-500:]}")
     
     def _on_generation_error(self, error):
         self.progress.stop()
@@ -39,9 +39,10 @@ set OUTPUT_FILE=Content_Schedule_OUTPUT\%BASENAME%_report.html
 echo Output will be: %OUTPUT_FILE%
 echo.
 echo Generating report...
+echo (a preview opens in your browser right away - reload it once images finish downloading)
 echo.
 
-"%PYTHON%" generate_report.py "%INPUT_FILE%" "%OUTPUT_FILE%"
+"%PYTHON%" generate_report.py "%INPUT_FILE%" "%OUTPUT_FILE%" --progressive --open
 
 if %ERRORLEVEL% NEQ 0 (
     echo.
@@ -58,8 +59,7 @@ echo ===================================
 echo Report generated successfully!
 echo ===================================
 echo.
-echo Opening in browser...
-start "" "%OUTPUT_FILE%"
+echo Reload the report in your browser to see the downloaded images.
 
 echo.
 echo ===================================